@@ -1,3 +1,6 @@
+import functools
+import sys
+from collections import namedtuple
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -5,6 +8,119 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Columns that may hold audience segment breakdowns, in analysis order
+POTENTIAL_SEGMENTS = ('age', 'gender', 'device', 'platform', 'placement', 'region',
+                      'country', 'device_platform')
+
+# Metric names, interned so comparisons against them hit the identity fast path
+_CTR = sys.intern('ctr')
+_CONV_RATE = sys.intern('conversion_rate')
+_CPA = sys.intern('cpa')
+
+# Metrics where a higher value is better (CPA is the lower-is-better metric)
+_HIGHER_IS_BETTER = frozenset((_CTR, _CONV_RATE))
+
+# Savings factor by difference bucket: <50%, 50-100%, >=100% of spend
+_SAVINGS_LUT = (0.15, 0.25, 0.40)
+
+# Recommendation text for one metric: the segment and cross-segment templates,
+# each with its (low, high) action templates, and the severity cutoff
+_MetricSpec = namedtuple('_MetricSpec', ['segment_tmpl', 'segment_actions',
+                                         'cross_segment_tmpl', 'cross_segment_actions', 'threshold'])
+
+# Recommendation specs by metric
+_METRIC_SPECS = {
+    'ctr': _MetricSpec(
+        "The {segment_type} segment '{best}' has a CTR of {best_formatted}, "
+        "which is {difference_pct:.1f}% higher than '{worst}' at {worst_formatted}.",
+        ("Test different ad creatives for the '{worst}' segment to improve engagement.",
+         "Consider reallocating budget from '{worst}' to '{best}' "
+         "or creating specific creatives for the underperforming segment."),
+        "The '{best}' audience has a CTR of {best_formatted}, "
+        "which is {difference_pct:.1f}% higher than '{worst}' at {worst_formatted}.",
+        ("Test different messaging for the '{worst}' audience to improve engagement.",
+         "Create a separate campaign targeting the '{best}' audience with "
+         "increased budget allocation. Consider revising creative strategy for '{worst}'."),
+        100  # More than double the performance
+    ),
+    'conversion_rate': _MetricSpec(
+        "The {segment_type} segment '{best}' has a conversion rate of {best_formatted}, "
+        "which is {difference_pct:.1f}% higher than '{worst}' at {worst_formatted}.",
+        ("Review landing page and conversion funnel for the '{worst}' segment "
+         "to identify and address potential friction points.",
+         "Significantly increase budget allocation to the '{best}' segment "
+         "and consider creating a separate campaign specifically for this audience."),
+        "The '{best}' audience has a conversion rate of {best_formatted}, "
+        "which is {difference_pct:.1f}% higher than '{worst}' at {worst_formatted}.",
+        ("Review the conversion path for '{worst}' audience to identify "
+         "potential issues in messaging, landing page, or offer relevance.",
+         "Significantly increase budget to the '{best}' audience and create "
+         "conversion-optimized campaigns specifically for this segment."),
+        100  # More than double the performance
+    ),
+    'cpa': _MetricSpec(
+        "The {segment_type} segment '{best}' has a CPA of {best_formatted}, "
+        "which is {difference_pct:.1f}% lower than '{worst}' at {worst_formatted}.",
+        ("Review bidding strategy and targeting settings for the '{worst}' segment "
+         "to improve cost efficiency.",
+         "Reduce budget for the '{worst}' segment and reallocate to '{best}' "
+         "to improve overall campaign efficiency."),
+        "The '{best}' audience has a CPA of {best_formatted}, "
+        "which is {difference_pct:.1f}% lower than '{worst}' at {worst_formatted}.",
+        ("Review bidding strategy and refine targeting for the '{worst}' audience.",
+         "Reduce budget for the '{worst}' audience and reallocate to '{best}' "
+         "to improve overall campaign efficiency."),
+        100  # More than double the efficiency
+    )
+}
+
+# Severity, indexed by "gap above threshold" like the action templates
+_SEV = ('medium', 'high')
+
+# Cross-segment recommendation type by metric
+_REC_TYPE = {metric: f"cross_segment_{metric}_optimization" for metric in _METRIC_SPECS}
+
+@functools.lru_cache(maxsize=64)
+def _segment_cols_for(columns):
+    """
+    Find which potential segment columns are present in a column layout.
+    
+    Args:
+        columns (tuple): Column labels of the insights data
+        
+    Returns:
+        tuple: Segment column names present in the layout
+    """
+    present = set(columns)
+    return tuple(col for col in POTENTIAL_SEGMENTS if col in present)
+
+# Display format for metric values in recommendation text
+_VALUE_FORMATS = {
+    'ctr': "{:.2f}%",
+    'conversion_rate': "{:.2f}%",
+    'cpa': "${:.2f}"
+}
+
+@functools.lru_cache(maxsize=1024)
+def _format_metric_cached(value, metric):
+    return _VALUE_FORMATS[metric].format(value)
+
+def _format_metric_value(value, metric):
+    """
+    Format a metric value for recommendation text.
+    
+    Values are quantized to the two displayed decimals first so that segments
+    with the same rounded value share a cache entry.
+    
+    Args:
+        value (float): Metric value
+        metric (str): Metric name ('ctr', 'conversion_rate' or 'cpa')
+        
+    Returns:
+        str: Formatted value (e.g., "1.25%" or "$12.40")
+    """
+    return _format_metric_cached(round(float(value), 2), metric)
+
 class AudienceTargetingAnalyzer:
     """
     Advanced audience targeting analysis using statistical methods to identify
@@ -89,11 +205,8 @@ class AudienceTargetingAnalyzer:
         Returns:
             list: List of segment column names
         """
-        potential_segments = ['age', 'gender', 'device', 'platform', 'placement', 'region', 
-                              'country', 'device_platform']
-        
-        # Find which potential segments are in the dataframe
-        available_segments = [col for col in potential_segments if col in df.columns]
+        # Find which potential segments are in the dataframe (cached per column layout)
+        available_segments = _segment_cols_for(tuple(df.columns))
         
         # Verify segments have multiple values
         valid_segments = []
@@ -217,7 +330,7 @@ class AudienceTargetingAnalyzer:
         segment_stats = self._calculate_segment_significance(df, segment_type, segment_metrics)
         
         # Identify best and worst performers
-        performance_metrics = ['ctr', 'conversion_rate', 'cpa'] if conv_col else ['ctr']
+        performance_metrics = [_CTR, _CONV_RATE, _CPA] if conv_col else [_CTR]
         best_worst = self._identify_best_worst_segments(segment_metrics, performance_metrics)
         
         # Format results
@@ -343,11 +456,11 @@ class AudienceTargetingAnalyzer:
                 continue
                 
             # For CTR and conversion_rate, higher is better
-            if metric in ['ctr', 'conversion_rate']:
+            if metric in _HIGHER_IS_BETTER:
                 best = segment_metrics.nlargest(1, metric)
                 worst = segment_metrics.nsmallest(1, metric)
             # For CPA, lower is better
-            elif metric == 'cpa':
+            elif metric == _CPA:
                 # Filter out zero values and infinities
                 valid_segments = segment_metrics[segment_metrics[metric] > 0]
                 if valid_segments.empty:
@@ -429,7 +542,7 @@ class AudienceTargetingAnalyzer:
                 cross_segment_metrics['spend'] / cross_segment_metrics[conv_col].replace(0, np.nan))
         
         # Identify top and bottom performers
-        performance_metrics = ['ctr', 'conversion_rate'] if conv_col else ['ctr']
+        performance_metrics = [_CTR, _CONV_RATE] if conv_col else [_CTR]
         
         results = {
             'cross_segment_metrics': cross_segment_metrics.to_dict('records'),
@@ -444,10 +557,10 @@ class AudienceTargetingAnalyzer:
                 continue
                 
             # Sort and get top/bottom segments
-            if metric in ['ctr', 'conversion_rate']:
+            if metric in _HIGHER_IS_BETTER:
                 top_segments = cross_segment_metrics.nlargest(3, metric)
                 bottom_segments = cross_segment_metrics.nsmallest(3, metric)
-            elif metric == 'cpa':
+            elif metric == _CPA:
                 valid_segments = cross_segment_metrics[cross_segment_metrics[metric] > 0]
                 if valid_segments.empty:
                     continue
@@ -496,6 +609,11 @@ class AudienceTargetingAnalyzer:
             if results.get('difference_pct', 0) < 30:  # Require at least 30% difference
                 continue
             
+            if metric not in _METRIC_SPECS:
+                continue
+            
+            spec = _METRIC_SPECS[metric]
+            
             best_segment = results['best']['segment']
             worst_segment = results['worst']['segment']
             best_value = results['best']['value']
@@ -503,73 +621,19 @@ class AudienceTargetingAnalyzer:
             difference_pct = results['difference_pct']
             
             # Format metric value based on metric type
-            if metric == 'ctr' or metric == 'conversion_rate':
-                best_formatted = f"{best_value:.2f}%"
-                worst_formatted = f"{worst_value:.2f}%"
-            elif metric == 'cpa':
-                best_formatted = f"${best_value:.2f}"
-                worst_formatted = f"${worst_value:.2f}"
-            else:
-                best_formatted = f"{best_value:.2f}"
-                worst_formatted = f"{worst_value:.2f}"
-            
-            # Tailor recommendation based on metric
-            recommendation_text = ""
-            action = ""
-            severity = "medium"
-            
-            if metric == 'ctr':
-                recommendation_text = (
-                    f"The {segment_type} segment '{best_segment}' has a CTR of {best_formatted}, "
-                    f"which is {difference_pct:.1f}% higher than '{worst_segment}' at {worst_formatted}."
-                )
-                
-                if difference_pct > 100:  # More than double the performance
-                    severity = "high"
-                    action = (
-                        f"Consider reallocating budget from '{worst_segment}' to '{best_segment}' "
-                        f"or creating specific creatives for the underperforming segment."
-                    )
-                else:
-                    action = (
-                        f"Test different ad creatives for the '{worst_segment}' segment to improve engagement."
-                    )
-                    
-            elif metric == 'conversion_rate':
-                recommendation_text = (
-                    f"The {segment_type} segment '{best_segment}' has a conversion rate of {best_formatted}, "
-                    f"which is {difference_pct:.1f}% higher than '{worst_segment}' at {worst_formatted}."
-                )
-                
-                if difference_pct > 100:  # More than double the performance
-                    severity = "high"
-                    action = (
-                        f"Significantly increase budget allocation to the '{best_segment}' segment "
-                        f"and consider creating a separate campaign specifically for this audience."
-                    )
-                else:
-                    action = (
-                        f"Review landing page and conversion funnel for the '{worst_segment}' segment "
-                        f"to identify and address potential friction points."
-                    )
-                    
-            elif metric == 'cpa':
-                recommendation_text = (
-                    f"The {segment_type} segment '{best_segment}' has a CPA of {best_formatted}, "
-                    f"which is {difference_pct:.1f}% lower than '{worst_segment}' at {worst_formatted}."
-                )
-                
-                if difference_pct > 100:  # More than double the efficiency
-                    severity = "high"
-                    action = (
-                        f"Reduce budget for the '{worst_segment}' segment and reallocate to '{best_segment}' "
-                        f"to improve overall campaign efficiency."
-                    )
-                else:
-                    action = (
-                        f"Review bidding strategy and targeting settings for the '{worst_segment}' segment "
-                        f"to improve cost efficiency."
-                    )
+            recommendation_text = spec.segment_tmpl.format(
+                segment_type=segment_type,
+                best=best_segment,
+                worst=worst_segment,
+                best_formatted=_format_metric_value(best_value, metric),
+                worst_formatted=_format_metric_value(worst_value, metric),
+                difference_pct=difference_pct
+            )
+            
+            # Tailor action and severity to the size of the gap
+            idx = int(difference_pct > spec.threshold)
+            severity = _SEV[idx]
+            action = spec.segment_actions[idx].format(best=best_segment, worst=worst_segment)
             
             # Create recommendation object
             recommendation = {
@@ -581,7 +645,7 @@ class AudienceTargetingAnalyzer:
                 'best_value': best_value,
                 'worst_value': worst_value,
                 'difference_pct': difference_pct,
-                'recommendation': f"{recommendation_text} {action}",
+                'recommendation': " ".join((recommendation_text, action)),
                 'severity': severity,
                 'potential_savings': self._estimate_potential_savings(
                     results['worst']['spend'], difference_pct)
@@ -606,121 +670,97 @@ class AudienceTargetingAnalyzer:
         if not cross_segment_results.get('significant_findings', False):
             return recommendations
         
-        for metric in ['ctr', 'conversion_rate', 'cpa']:
-            top_segments = cross_segment_results.get('top_segments', {}).get(metric, [])
-            bottom_segments = cross_segment_results.get('bottom_segments', {}).get(metric, [])
-            
-            if not top_segments or not bottom_segments:
-                continue
-            
+        top_segments = cross_segment_results.get('top_segments', {})
+        bottom_segments = cross_segment_results.get('bottom_segments', {})
+        
+        # Metrics with both a best and a worst performer
+        metrics = [metric for metric in _METRIC_SPECS
+                   if top_segments.get(metric) and bottom_segments.get(metric)]
+        
+        if not metrics:
+            return recommendations
+        
+        # Compute the best vs. worst difference for all metrics at once
+        best_values = np.array([top_segments[metric][0][metric] for metric in metrics], dtype=float)
+        worst_values = np.array([bottom_segments[metric][0][metric] for metric in metrics], dtype=float)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff_pcts = np.where(
+                worst_values != 0,
+                np.abs((best_values - worst_values) / worst_values * 100),
+                100  # Default if worst is zero
+            )
+        
+        # Only build recommendations where the difference is large enough
+        selected = np.flatnonzero(~(diff_pcts < 50))
+        
+        # All records share the cross-segment columns, so the description is built once
+        segment_keys = list(top_segments[metrics[0]][0].keys())[:2]  # Get the first two segment columns
+        combined_desc = f"combined_{segment_keys[0]}_{segment_keys[1]}"
+        
+        # Build the per-recommendation columns
+        selected_metrics = [metrics[i] for i in selected]
+        best_descs, worst_descs, texts, severities = [], [], [], []
+        best_vals, worst_vals, worst_spends = [], [], []
+        
+        for metric, diff_pct in zip(selected_metrics, diff_pcts[selected].tolist()):
             # Get best and worst performers
-            best_segment = top_segments[0]
-            worst_segment = bottom_segments[0]
+            best_segment = top_segments[metric][0]
+            worst_segment = bottom_segments[metric][0]
+            bv, wv, ws = best_segment[metric], worst_segment[metric], worst_segment['spend']
             
             # Construct segment description (e.g., "Women 25-34")
-            segment_keys = list(best_segment.keys())[:2]  # Get the first two segment columns
             best_desc = " ".join(str(best_segment[key]) for key in segment_keys)
             worst_desc = " ".join(str(worst_segment[key]) for key in segment_keys)
             
+            spec = _METRIC_SPECS[metric]
+            
             # Format metric values
-            if metric == 'ctr' or metric == 'conversion_rate':
-                best_formatted = f"{best_segment[metric]:.2f}%"
-                worst_formatted = f"{worst_segment[metric]:.2f}%"
-                
-                if worst_segment[metric] != 0:
-                    diff_pct = abs((best_segment[metric] - worst_segment[metric]) / worst_segment[metric] * 100)
-                else:
-                    diff_pct = 100  # Default if worst is zero
-                    
-            elif metric == 'cpa':
-                best_formatted = f"${best_segment[metric]:.2f}"
-                worst_formatted = f"${worst_segment[metric]:.2f}"
-                
-                if worst_segment[metric] != 0:
-                    diff_pct = abs((best_segment[metric] - worst_segment[metric]) / worst_segment[metric] * 100)
-                else:
-                    diff_pct = 100  # Default if worst is zero
-            else:
-                continue  # Skip unknown metrics
+            recommendation_text = spec.cross_segment_tmpl.format(
+                best=best_desc,
+                worst=worst_desc,
+                best_formatted=_format_metric_value(bv, metric),
+                worst_formatted=_format_metric_value(wv, metric),
+                difference_pct=diff_pct
+            )
             
-            # Skip if difference is too small
-            if diff_pct < 50:
-                continue
-                
             # Create recommendation based on metric
-            recommendation_text = ""
-            action = ""
-            severity = "medium"
-            
-            if metric == 'ctr':
-                recommendation_text = (
-                    f"The '{best_desc}' audience has a CTR of {best_formatted}, "
-                    f"which is {diff_pct:.1f}% higher than '{worst_desc}' at {worst_formatted}."
-                )
-                
-                if diff_pct > 100:
-                    severity = "high"
-                    action = (
-                        f"Create a separate campaign targeting the '{best_desc}' audience with "
-                        f"increased budget allocation. Consider revising creative strategy for '{worst_desc}'."
-                    )
-                else:
-                    action = (
-                        f"Test different messaging for the '{worst_desc}' audience to improve engagement."
-                    )
-                    
-            elif metric == 'conversion_rate':
-                recommendation_text = (
-                    f"The '{best_desc}' audience has a conversion rate of {best_formatted}, "
-                    f"which is {diff_pct:.1f}% higher than '{worst_desc}' at {worst_formatted}."
-                )
-                
-                if diff_pct > 100:
-                    severity = "high"
-                    action = (
-                        f"Significantly increase budget to the '{best_desc}' audience and create "
-                        f"conversion-optimized campaigns specifically for this segment."
-                    )
-                else:
-                    action = (
-                        f"Review the conversion path for '{worst_desc}' audience to identify "
-                        f"potential issues in messaging, landing page, or offer relevance."
-                    )
-                    
-            elif metric == 'cpa':
-                recommendation_text = (
-                    f"The '{best_desc}' audience has a CPA of {best_formatted}, "
-                    f"which is {diff_pct:.1f}% lower than '{worst_desc}' at {worst_formatted}."
-                )
-                
-                if diff_pct > 100:
-                    severity = "high"
-                    action = (
-                        f"Reduce budget for the '{worst_desc}' audience and reallocate to '{best_desc}' "
-                        f"to improve overall campaign efficiency."
-                    )
-                else:
-                    action = (
-                        f"Review bidding strategy and refine targeting for the '{worst_desc}' audience."
-                    )
-            
-            # Create recommendation object
-            recommendation = {
-                'type': f"cross_segment_{metric}_optimization",
-                'segment_description': f"combined_{segment_keys[0]}_{segment_keys[1]}",
+            idx = int(diff_pct > spec.threshold)
+            severity = _SEV[idx]
+            action = spec.cross_segment_actions[idx].format(best=best_desc, worst=worst_desc)
+            
+            best_descs.append(best_desc)
+            worst_descs.append(worst_desc)
+            texts.append(" ".join((recommendation_text, action)))
+            severities.append(severity)
+            best_vals.append(bv)
+            worst_vals.append(wv)
+            worst_spends.append(ws)
+        
+        # Estimate savings for all selected metrics in one pass
+        savings = self._estimate_potential_savings_batch(
+            np.array(worst_spends, dtype=float), diff_pcts[selected])
+        
+        # Assemble the recommendation dicts from the columns in one pass
+        columns = zip(selected_metrics, best_descs, worst_descs, best_vals, worst_vals,
+                      diff_pcts[selected].tolist(), texts, severities, savings.tolist())
+        recommendations = [
+            {
+                'type': _REC_TYPE[metric],
+                'segment_description': combined_desc,
                 'best_segment': best_desc,
                 'worst_segment': worst_desc,
                 'metric': metric,
-                'best_value': best_segment[metric],
-                'worst_value': worst_segment[metric],
+                'best_value': best_value,
+                'worst_value': worst_value,
                 'difference_pct': diff_pct,
-                'recommendation': f"{recommendation_text} {action}",
+                'recommendation': text,
                 'severity': severity,
-                'potential_savings': self._estimate_potential_savings(
-                    worst_segment['spend'], diff_pct)
+                'potential_savings': potential_savings
             }
-            
-            recommendations.append(recommendation)
+            for (metric, best_desc, worst_desc, best_value, worst_value,
+                 diff_pct, text, severity, potential_savings) in columns
+        ]
         
         return recommendations
     
@@ -738,11 +778,21 @@ class AudienceTargetingAnalyzer:
         # Conservative estimate: 
         # For small differences (<50%), savings potential is lower
         # For large differences (>100%), savings potential is higher
-        if difference_pct < 50:
-            savings_factor = 0.15  # 15% of spend
-        elif difference_pct < 100:
-            savings_factor = 0.25  # 25% of spend
-        else:
-            savings_factor = 0.4   # 40% of spend
-        
-        return spend * savings_factor
\ No newline at end of file
+        # (negated "<" comparisons so an undefined difference keeps the top factor)
+        idx = (not difference_pct < 50) + (not difference_pct < 100)
+        return spend * _SAVINGS_LUT[idx]
+    
+    def _estimate_potential_savings_batch(self, spends, difference_pcts):
+        """
+        Estimate potential savings for many segments at once.
+        
+        Args:
+            spends (ndarray): Current spend on each underperforming segment
+            difference_pcts (ndarray): Performance difference percentages
+            
+        Returns:
+            ndarray: Estimated potential savings, same factors as _estimate_potential_savings
+        """
+        savings_factors = np.where(difference_pcts < 50, _SAVINGS_LUT[0],
+                                   np.where(difference_pcts < 100, _SAVINGS_LUT[1], _SAVINGS_LUT[2]))
+        return spends * savings_factors
\ No newline at end of file
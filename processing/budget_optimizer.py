@@ -1,9 +1,59 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
+import copy
 import logging
-from datetime import datetime, timedelta
-import math
+import sys
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; scoring falls back to NumPy
+    NUMBA_AVAILABLE = False
+
+# Recommendation types and severities, shared by every recommendation dict
+_TYPE_CAMPAIGN = sys.intern('campaign_budget_inefficiency')
+_TYPE_ADSET = sys.intern('adset_budget_inefficiency')
+_TYPE_AD = sys.intern('ad_performance_inefficiency')
+_TYPE_ALLOCATION = sys.intern('budget_allocation_imbalance')
+_SEVERITY_HIGH = sys.intern('high')
+_SEVERITY_MEDIUM = sys.intern('medium')
+
+def _score_rows(indices, weights, higher_is_better):
+    """
+    Efficiency score kernel over a matrix of performance indices.
+    
+    Args:
+        indices (ndarray): One row per entity, one column per index metric (NaN if missing)
+        weights (ndarray): Weight of each index metric
+        higher_is_better (ndarray): Whether each index metric is rescaled around 100
+        
+    Returns:
+        ndarray: Efficiency score (0-100) for each row
+    """
+    n_rows, n_metrics = indices.shape
+    scores = np.empty(n_rows)
+    
+    for i in range(n_rows):
+        score = 50.0
+        weight_sum = 0.0
+        
+        for j in range(n_metrics):
+            value = indices[i, j]
+            if not np.isnan(value) and value > 0:
+                metric_score = min(value, 200.0)
+                if higher_is_better[j]:
+                    metric_score = (metric_score / 2) + 50
+                score += (metric_score - 50) * weights[j]
+                weight_sum += weights[j]
+        
+        if weight_sum < 0.5:
+            score = score * (weight_sum * 2) + 50 * (1 - (weight_sum * 2))
+        
+        scores[i] = max(0.0, min(100.0, score))
+    
+    return scores
+
+_score_kernel = njit(cache=True)(_score_rows) if NUMBA_AVAILABLE else None
 
 class BudgetOptimizer:
     """
@@ -12,7 +62,7 @@ class BudgetOptimizer:
     """
     
     def __init__(self, min_campaign_spend=100, min_adset_spend=50, 
-                 min_data_threshold=1000, confidence_level=0.90):
+                 min_data_threshold=1000, confidence_level=0.90, cache_results=False):
         """
         Initialize the budget optimizer with threshold settings.
         
@@ -21,17 +71,85 @@ class BudgetOptimizer:
             min_adset_spend (float): Minimum ad set spend to analyze ($)
             min_data_threshold (int): Minimum impressions for statistical significance
             confidence_level (float): Statistical confidence level (0-1)
+            cache_results (bool): Memoize analyze() results for repeated calls on
+                the same data (see _analysis_cache_key for the fingerprint's limits)
         """
         self.min_campaign_spend = min_campaign_spend
         self.min_adset_spend = min_adset_spend
         self.min_data_threshold = min_data_threshold
         self.confidence_level = confidence_level
         self.logger = logging.getLogger(__name__)
+        self.cache_results = cache_results
+        self._analysis_cache = {}
+    
+    # Number of analyses kept by analyze() for repeated calls on the same data
+    _ANALYSIS_CACHE_SIZE = 16
     
     def analyze(self, campaigns_df, ad_sets_df, ads_df, insights_df):
         """
         Analyze budget efficiency across campaigns, ad sets, and ads.
         
+        With cache_results enabled, results are memoized per optimizer on a
+        fingerprint of the input data and the current thresholds, so re-running
+        on unchanged data is cheap.
+        
+        Args:
+            campaigns_df (DataFrame): Campaign data
+            ad_sets_df (DataFrame): Ad set data
+            ads_df (DataFrame): Ad data
+            insights_df (DataFrame): Performance insights data
+            
+        Returns:
+            dict: Budget optimization analysis and recommendations
+        """
+        if not self.cache_results:
+            return self._run_analysis(campaigns_df, ad_sets_df, ads_df, insights_df)
+        
+        cache_key = self._analysis_cache_key(campaigns_df, ad_sets_df, ads_df, insights_df)
+        if cache_key in self._analysis_cache:
+            return copy.deepcopy(self._analysis_cache[cache_key])
+        
+        results = self._run_analysis(campaigns_df, ad_sets_df, ads_df, insights_df)
+        
+        if len(self._analysis_cache) >= self._ANALYSIS_CACHE_SIZE:
+            self._analysis_cache.pop(next(iter(self._analysis_cache)))
+        self._analysis_cache[cache_key] = copy.deepcopy(results)
+        
+        return results
+    
+    def _analysis_cache_key(self, campaigns_df, ad_sets_df, ads_df, insights_df):
+        """
+        Build the memoization key for a set of inputs.
+        
+        The fingerprint is cheap (row counts and insight spend and impressions
+        totals) rather than a content hash, which would cost about as much as the
+        analysis. Different data with the same counts and totals, e.g. spend moved
+        between campaigns, gets the earlier result; this is why caching is opt-in.
+        
+        Args:
+            campaigns_df (DataFrame): Campaign data
+            ad_sets_df (DataFrame): Ad set data
+            ads_df (DataFrame): Ad data
+            insights_df (DataFrame): Performance insights data
+            
+        Returns:
+            tuple: Data fingerprint plus thresholds
+        """
+        row_counts = tuple(None if df is None else len(df)
+                           for df in (campaigns_df, ad_sets_df, ads_df, insights_df))
+        totals = tuple(
+            float(pd.to_numeric(insights_df[col], errors='coerce').sum())
+            if insights_df is not None and col in insights_df.columns else None
+            for col in ('spend', 'impressions')
+        )
+        
+        return (row_counts, totals, self.min_campaign_spend, self.min_adset_spend,
+                self.min_data_threshold, self.confidence_level)
+    
+    def _run_analysis(self, campaigns_df, ad_sets_df, ads_df, insights_df):
+        """
+        Run the full budget analysis without consulting the cache.
+        
         Args:
             campaigns_df (DataFrame): Campaign data
             ad_sets_df (DataFrame): Ad set data
@@ -78,15 +196,12 @@ class BudgetOptimizer:
             results['recommendations'].extend(budget_results['recommendations'])
         
         # Calculate total estimated savings
-        total_savings = sum(rec.get('potential_savings', 0) for rec in results['recommendations'])
-        results['estimated_savings'] = total_savings
-        
-        # Sort recommendations by potential impact
-        results['recommendations'] = sorted(
-            results['recommendations'], 
-            key=lambda x: x.get('potential_savings', 0), 
-            reverse=True
-        )
+        savings = [rec.get('potential_savings', 0) for rec in results['recommendations']]
+        results['estimated_savings'] = sum(savings)
+        
+        # Sort recommendations by potential impact (stable, highest first)
+        order = np.argsort(-np.asarray(savings, dtype=float), kind='stable')
+        results['recommendations'] = [results['recommendations'][i] for i in order]
         
         return results
     
@@ -94,6 +209,9 @@ class BudgetOptimizer:
         """
         Clean and prepare data for analysis.
         
+        Campaign and insights data must be DataFrames; ad set and ad data may
+        also be None or records, which are converted.
+        
         Args:
             campaigns_df (DataFrame): Campaign data
             ad_sets_df (DataFrame): Ad set data
@@ -109,11 +227,9 @@ class BudgetOptimizer:
             self.logger.warning("Missing required campaign or insights data for budget analysis")
             return None
         
-        # Convert to DataFrame if needed
-        campaigns_df = pd.DataFrame(campaigns_df) if not isinstance(campaigns_df, pd.DataFrame) else campaigns_df
+        # Convert optional ad set and ad data to DataFrames if needed (None becomes empty)
         ad_sets_df = pd.DataFrame(ad_sets_df) if not isinstance(ad_sets_df, pd.DataFrame) else ad_sets_df
         ads_df = pd.DataFrame(ads_df) if not isinstance(ads_df, pd.DataFrame) else ads_df
-        insights_df = pd.DataFrame(insights_df) if not isinstance(insights_df, pd.DataFrame) else insights_df
         
         # Make sure we have campaign IDs
         if 'id' not in campaigns_df.columns and 'campaign_id' not in campaigns_df.columns:
@@ -122,7 +238,7 @@ class BudgetOptimizer:
         
         # Rename columns for consistency if needed
         if 'id' in campaigns_df.columns and 'campaign_id' not in campaigns_df.columns:
-            campaigns_df['campaign_id'] = campaigns_df['id']
+            campaigns_df = campaigns_df.assign(campaign_id=campaigns_df['id'])
         
         # Ensure we have insights for campaigns
         if 'campaign_id' not in insights_df.columns:
@@ -131,130 +247,190 @@ class BudgetOptimizer:
         
         # Ensure numeric data types
         numeric_cols = ['spend', 'impressions', 'clicks', 'conversions', 'purchases']
-        for col in numeric_cols:
-            if col in insights_df.columns:
-                insights_df[col] = pd.to_numeric(insights_df[col], errors='coerce').fillna(0)
+        insights_df = insights_df.assign(**{
+            col: pd.to_numeric(insights_df[col], errors='coerce').fillna(0)
+            for col in numeric_cols if col in insights_df.columns
+        })
         
         # Add conversion column if it doesn't exist but purchases does
         if 'conversions' not in insights_df.columns and 'purchases' in insights_df.columns:
             insights_df['conversions'] = insights_df['purchases']
         
-        # Prepare campaign-level data
-        campaign_insights = insights_df.groupby('campaign_id').agg({
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'spend': 'sum',
-            'conversions': 'sum' if 'conversions' in insights_df.columns else 'count'
-        }).reset_index()
-        
-        # Calculate campaign-level metrics
-        campaign_insights['ctr'] = (campaign_insights['clicks'] / campaign_insights['impressions']) * 100
-        campaign_insights['cpm'] = (campaign_insights['spend'] / campaign_insights['impressions']) * 1000
-        campaign_insights['cpc'] = campaign_insights['spend'] / campaign_insights['clicks']
-        campaign_insights['conversion_rate'] = (campaign_insights['conversions'] / campaign_insights['clicks']) * 100
-        campaign_insights['cpa'] = campaign_insights['spend'] / campaign_insights['conversions']
-        
-        # Clean up infinity and NaN values
-        campaign_insights = campaign_insights.replace([np.inf, -np.inf], np.nan)
-        
-        # Merge with campaign data
-        campaigns = campaigns_df.merge(
-            campaign_insights, 
-            left_on='campaign_id', 
-            right_on='campaign_id', 
-            how='inner'
-        )
-        
-        # Filter campaigns by minimum spend
-        campaigns = campaigns[campaigns['spend'] >= self.min_campaign_spend]
+        # Sum insights once at the finest level needed; coarser levels roll up from it
+        has_adsets = not ad_sets_df.empty and 'adset_id' in insights_df.columns
+        has_ads = not ads_df.empty and 'ad_id' in insights_df.columns
+        level_insights = self._rollup_base(insights_df, has_adsets, has_ads)
         
+        # Prepare campaign-level data, keeping campaigns above the minimum spend
         prepared_data = {
-            'campaigns': campaigns,
+            'campaigns': self._build_level(campaigns_df, level_insights, 'campaign_id',
+                                           min_spend=self.min_campaign_spend),
             'insights': insights_df
         }
         
         # Prepare ad set-level data if available
-        if not ad_sets_df.empty and 'adset_id' in insights_df.columns:
-            # Rename columns for consistency if needed
-            if 'id' in ad_sets_df.columns and 'adset_id' not in ad_sets_df.columns:
-                ad_sets_df['adset_id'] = ad_sets_df['id']
-            
-            # Aggregate insights at ad set level
-            adset_insights = insights_df.groupby('adset_id').agg({
-                'campaign_id': 'first',
-                'impressions': 'sum',
-                'clicks': 'sum',
-                'spend': 'sum',
-                'conversions': 'sum' if 'conversions' in insights_df.columns else 'count'
-            }).reset_index()
-            
-            # Calculate ad set-level metrics
-            adset_insights['ctr'] = (adset_insights['clicks'] / adset_insights['impressions']) * 100
-            adset_insights['cpm'] = (adset_insights['spend'] / adset_insights['impressions']) * 1000
-            adset_insights['cpc'] = adset_insights['spend'] / adset_insights['clicks']
-            adset_insights['conversion_rate'] = (adset_insights['conversions'] / adset_insights['clicks']) * 100
-            adset_insights['cpa'] = adset_insights['spend'] / adset_insights['conversions']
-            
-            # Clean up infinity and NaN values
-            adset_insights = adset_insights.replace([np.inf, -np.inf], np.nan)
-            
-            # Merge with ad set data
-            ad_sets = ad_sets_df.merge(
-                adset_insights, 
-                left_on='adset_id', 
-                right_on='adset_id', 
-                how='inner'
-            )
-            
-            # Filter ad sets by minimum spend
-            ad_sets = ad_sets[ad_sets['spend'] >= self.min_adset_spend]
-            
-            prepared_data['ad_sets'] = ad_sets
+        if has_adsets:
+            prepared_data['ad_sets'] = self._build_level(ad_sets_df, level_insights, 'adset_id',
+                                                         first_cols=('campaign_id',),
+                                                         min_spend=self.min_adset_spend)
         else:
             prepared_data['ad_sets'] = pd.DataFrame()
         
         # Prepare ad-level data if available
-        if not ads_df.empty and 'ad_id' in insights_df.columns:
-            # Rename columns for consistency if needed
-            if 'id' in ads_df.columns and 'ad_id' not in ads_df.columns:
-                ads_df['ad_id'] = ads_df['id']
-            
-            # Aggregate insights at ad level
-            ad_insights = insights_df.groupby('ad_id').agg({
-                'campaign_id': 'first',
-                'adset_id': 'first' if 'adset_id' in insights_df.columns else None,
-                'impressions': 'sum',
-                'clicks': 'sum',
-                'spend': 'sum',
-                'conversions': 'sum' if 'conversions' in insights_df.columns else 'count'
-            }).reset_index()
-            
-            # Remove any None columns
-            ad_insights = ad_insights.loc[:, ad_insights.columns.notna()]
+        if has_ads:
+            prepared_data['ads'] = self._build_level(ads_df, level_insights, 'ad_id',
+                                                     first_cols=('campaign_id', 'adset_id'))
+        else:
+            prepared_data['ads'] = pd.DataFrame()
+        
+        return prepared_data
+    
+    def _join_on_id(self, entities_df, group_metrics, key):
+        """
+        Inner-join entity data with its aggregated metrics on a single ID column.
+        
+        Equivalent to an inner merge on the key (same row and column order and
+        _x/_y suffixes), but looks rows up on the unique metrics index instead of
+        building a merge plan.
+        
+        Args:
+            entities_df (DataFrame): Entity data (campaigns, ad sets, or ads)
+            group_metrics (DataFrame): One row per entity ID with aggregated metrics
+            key (str): ID column shared by both frames
             
-            # Calculate ad-level metrics
-            ad_insights['ctr'] = (ad_insights['clicks'] / ad_insights['impressions']) * 100
-            ad_insights['cpm'] = (ad_insights['spend'] / ad_insights['impressions']) * 1000
-            ad_insights['cpc'] = ad_insights['spend'] / ad_insights['clicks']
-            ad_insights['conversion_rate'] = (ad_insights['conversions'] / ad_insights['clicks']) * 100
-            ad_insights['cpa'] = ad_insights['spend'] / ad_insights['conversions']
+        Returns:
+            DataFrame: Entity rows that have metrics, with the metric columns appended
+        """
+        metrics = group_metrics.set_index(key)
+        positions = metrics.index.get_indexer(entities_df[key])
+        rows = np.flatnonzero(positions >= 0)
+        
+        # Like merge, emit duplicate IDs together in order of first appearance
+        keys = entities_df[key].to_numpy()[rows]
+        if not pd.Series(keys).is_unique:
+            rows = rows[np.argsort(pd.factorize(keys, use_na_sentinel=False)[0], kind='stable')]
+        
+        left = entities_df.iloc[rows].reset_index(drop=True)
+        right = metrics.iloc[positions[rows]].reset_index(drop=True)
+        
+        overlap = left.columns.intersection(right.columns)
+        if len(overlap):
+            left = left.rename(columns={col: f"{col}_x" for col in overlap})
+            right = right.rename(columns={col: f"{col}_y" for col in overlap})
+        
+        return pd.concat([left, right], axis=1)
+    
+    def _rollup_base(self, insights_df, has_adsets, has_ads):
+        """
+        Pre-aggregate insights by every entity ID used in the analysis.
+        
+        Rows keep their first-appearance order, so per-entity sums and 'first'
+        parent IDs computed from the result match those of the raw insights.
+        
+        Args:
+            insights_df (DataFrame): Performance insights data
+            has_adsets (bool): Whether ad set metrics will be computed
+            has_ads (bool): Whether ad metrics will be computed
             
-            # Clean up infinity and NaN values
-            ad_insights = ad_insights.replace([np.inf, -np.inf], np.nan)
+        Returns:
+            DataFrame: Insights summed per ID combination (or the input if only campaigns are needed)
+        """
+        keys = ['campaign_id']
+        if has_adsets:
+            keys.append('adset_id')
+        if has_ads:
+            keys.append('ad_id')
+            if 'adset_id' in insights_df.columns and 'adset_id' not in keys:
+                keys.insert(1, 'adset_id')
+        
+        if len(keys) == 1:
+            return insights_df
+        
+        sum_cols = [col for col in ('impressions', 'clicks', 'spend', 'conversions')
+                    if col in insights_df.columns]
+        return insights_df.groupby(keys, sort=False, dropna=False)[sum_cols].sum().reset_index()
+    
+    def _build_level(self, entities_df, level_insights, key, first_cols=(), min_spend=None):
+        """
+        Prepare one entity level: aggregate its insights and attach them to the entities.
+        
+        Args:
+            entities_df (DataFrame): Entity data (campaigns, ad sets, or ads)
+            level_insights (DataFrame): Insights, raw or pre-aggregated by _rollup_base
+            key (str): Entity ID column; filled from 'id' when missing
+            first_cols (tuple): Parent ID columns to carry over from each entity's first row
+            min_spend (float): Minimum spend for an entity to be kept (None keeps all)
             
-            # Merge with ad data
-            ads = ads_df.merge(
-                ad_insights, 
-                left_on='ad_id', 
-                right_on='ad_id', 
-                how='inner'
-            )
+        Returns:
+            DataFrame: Entities with their totals and ratio metrics
+        """
+        # Rename columns for consistency if needed
+        if 'id' in entities_df.columns and key not in entities_df.columns:
+            entities_df = entities_df.assign(**{key: entities_df['id']})
+        
+        group_metrics = self._compute_group_metrics(level_insights, key, first_cols=first_cols)
+        level = self._join_on_id(entities_df, group_metrics, key)
+        
+        if min_spend is not None:
+            level = level[level['spend'] >= min_spend]
+        
+        return level
+    
+    def _compute_group_metrics(self, insights_df, key, first_cols=()):
+        """
+        Aggregate insights by an entity ID and calculate its performance ratios.
+        
+        Args:
+            insights_df (DataFrame): Performance insights data
+            key (str): Entity ID column to group by
+            first_cols (tuple): Parent ID columns to carry over from each entity's first row
             
-            prepared_data['ads'] = ads
-        else:
-            prepared_data['ads'] = pd.DataFrame()
+        Returns:
+            DataFrame: One row per entity with totals and ratio metrics
+        """
+        agg_spec = {col: 'first' for col in first_cols if col in insights_df.columns}
+        agg_spec.update({
+            'impressions': 'sum',
+            'clicks': 'sum',
+            'spend': 'sum'
+        })
+        if 'conversions' in insights_df.columns:
+            agg_spec['conversions'] = 'sum'
+        
+        group_metrics = insights_df.groupby(key).agg(agg_spec).reset_index()
+        
+        # No conversion data means no conversions, not a count of insight rows
+        if 'conversions' not in group_metrics.columns:
+            group_metrics['conversions'] = 0.0
+        
+        impressions = group_metrics['impressions'].to_numpy(dtype=np.float64)
+        clicks = group_metrics['clicks'].to_numpy(dtype=np.float64)
+        spend = group_metrics['spend'].to_numpy(dtype=np.float64)
+        conversions = group_metrics['conversions'].to_numpy(dtype=np.float64)
+        
+        # Calculate ratio metrics (NaN where the denominator is zero)
+        group_metrics['ctr'] = self._safe_divide(clicks, impressions) * 100
+        group_metrics['cpm'] = self._safe_divide(spend, impressions) * 1000
+        group_metrics['cpc'] = self._safe_divide(spend, clicks)
+        group_metrics['conversion_rate'] = self._safe_divide(conversions, clicks) * 100
+        group_metrics['cpa'] = self._safe_divide(spend, conversions)
+        
+        return group_metrics
+    
+    def _safe_divide(self, numerator, denominator):
+        """
+        Divide two arrays without producing infinities.
         
-        return prepared_data
+        Args:
+            numerator (ndarray): Numerator values
+            denominator (ndarray): Denominator values
+            
+        Returns:
+            ndarray: Quotients, NaN where the denominator is zero
+        """
+        result = np.full(len(numerator), np.nan)
+        np.divide(numerator, denominator, out=result, where=denominator != 0)
+        return result
     
     def _analyze_campaigns(self, campaigns_df):
         """
@@ -274,6 +450,11 @@ class BudgetOptimizer:
             'recommendations': []
         }
         
+        # Nothing to score if no campaign has enough data
+        sufficient_data = ~(campaigns_df['impressions'] < self.min_data_threshold)
+        if not sufficient_data.any():
+            return results
+        
         # Calculate average performance metrics
         avg_metrics = {
             'ctr': campaigns_df['ctr'].mean(),
@@ -283,97 +464,59 @@ class BudgetOptimizer:
             'cpa': campaigns_df['cpa'].mean() if 'cpa' in campaigns_df.columns else None
         }
         
-        # Analyze each campaign
-        for _, campaign in campaigns_df.iterrows():
-            # Skip campaigns with insufficient data
-            if campaign['impressions'] < self.min_data_threshold:
-                continue
-            
-            campaign_id = campaign['campaign_id']
-            campaign_name = campaign.get('name', f"Campaign {campaign_id}")
-            
-            # Calculate efficiency metrics
-            efficiency_metrics = {
-                'campaign_id': campaign_id,
-                'campaign_name': campaign_name,
-                'spend': campaign['spend'],
-                'impressions': campaign['impressions'],
-                'clicks': campaign['clicks'],
-                'conversions': campaign['conversions'] if 'conversions' in campaign else 0,
-                'ctr': campaign['ctr'],
-                'cpm': campaign['cpm'],
-                'cpc': campaign['cpc'],
-                'ctr_index': (campaign['ctr'] / avg_metrics['ctr']) * 100 if avg_metrics['ctr'] > 0 else 0,
-                'cpm_index': (avg_metrics['cpm'] / campaign['cpm']) * 100 if campaign['cpm'] > 0 else 0,
-                'cpc_index': (avg_metrics['cpc'] / campaign['cpc']) * 100 if campaign['cpc'] > 0 else 0
-            }
-            
-            # Add conversion metrics if available
-            if 'conversion_rate' in campaign and avg_metrics['conversion_rate'] is not None:
-                efficiency_metrics['conversion_rate'] = campaign['conversion_rate']
-                efficiency_metrics['cpa'] = campaign['cpa'] if 'cpa' in campaign else None
-                
-                if avg_metrics['conversion_rate'] > 0:
-                    efficiency_metrics['conversion_rate_index'] = (campaign['conversion_rate'] / avg_metrics['conversion_rate']) * 100
-                else:
-                    efficiency_metrics['conversion_rate_index'] = 0
-                    
-                if 'cpa' in campaign and avg_metrics['cpa'] is not None and campaign['cpa'] > 0:
-                    efficiency_metrics['cpa_index'] = (avg_metrics['cpa'] / campaign['cpa']) * 100
-                else:
-                    efficiency_metrics['cpa_index'] = 0
-            
-            # Calculate overall efficiency score (0-100)
-            efficiency_score = self._calculate_efficiency_score(efficiency_metrics)
-            efficiency_metrics['efficiency_score'] = efficiency_score
-            
-            # Add to metrics
-            results['metrics'].append(efficiency_metrics)
-            
+        # Skip campaigns with insufficient data
+        campaigns_df = campaigns_df[sufficient_data]
+        
+        # Calculate efficiency metrics for all campaigns at once
+        campaign_ids = campaigns_df['campaign_id']
+        efficiency_df = self._build_efficiency_metrics(campaigns_df, avg_metrics, {
+            'campaign_id': campaign_ids,
+            'campaign_name': (campaigns_df['name'] if 'name' in campaigns_df.columns
+                              else "Campaign " + campaign_ids.astype(str))
+        })
+        
+        # Calculate overall efficiency scores (0-100)
+        efficiency_df['efficiency_score'] = self._calculate_efficiency_score_vec(efficiency_df)
+        
+        # Add to metrics
+        results['metrics'] = efficiency_df.to_dict('records')
+        
+        # Only inefficient campaigns need recommendations
+        flagged = np.flatnonzero(efficiency_df['efficiency_score'].to_numpy() < 60)
+        flagged_rows = efficiency_df[['campaign_id', 'campaign_name', 'spend', 'efficiency_score']].iloc[flagged]
+        
+        # Build the recommendation texts for all flagged campaigns at once
+        main_issues = self._identify_main_issues_vec(efficiency_df.iloc[flagged])
+        subjects = "Campaign '" + flagged_rows['campaign_name'].astype(str) + "' is "
+        details = " (score: " + self._score_labels(flagged_rows['efficiency_score']) + "/100) with " + main_issues
+        texts = np.where(
+            flagged_rows['efficiency_score'] < 40,
+            subjects + "highly inefficient" + details +
+            ". Consider reducing budget by 30% and reallocating to better-performing campaigns.",
+            subjects + "performing below average" + details +
+            ". Consider reducing budget by 15% or optimizing targeting."
+        )
+        
+        for (campaign_id, campaign_name, spend, efficiency_score), main_issue, text in zip(
+                flagged_rows.itertuples(index=False, name=None), main_issues, texts):
             # Generate recommendations for inefficient campaigns
             if efficiency_score < 40:  # Very inefficient
-                severity = "high"
-                potential_savings = campaign['spend'] * 0.3  # 30% of spend
-                
-                # Determine main issue
-                main_issue = self._identify_main_issue(efficiency_metrics)
-                
-                recommendation = {
-                    'type': 'campaign_budget_inefficiency',
-                    'campaign_id': campaign_id,
-                    'campaign_name': campaign_name,
-                    'efficiency_score': efficiency_score,
-                    'main_issue': main_issue,
-                    'severity': severity,
-                    'potential_savings': potential_savings,
-                    'recommendation': (
-                        f"Campaign '{campaign_name}' is highly inefficient (score: {efficiency_score:.0f}/100) "
-                        f"with {main_issue}. Consider reducing budget by 30% and reallocating to better-performing campaigns."
-                    )
-                }
-                results['recommendations'].append(recommendation)
-                
+                severity = _SEVERITY_HIGH
+                potential_savings = spend * 0.3  # 30% of spend
             elif efficiency_score < 60:  # Moderately inefficient
-                severity = "medium"
-                potential_savings = campaign['spend'] * 0.15  # 15% of spend
-                
-                # Determine main issue
-                main_issue = self._identify_main_issue(efficiency_metrics)
-                
-                recommendation = {
-                    'type': 'campaign_budget_inefficiency',
-                    'campaign_id': campaign_id,
-                    'campaign_name': campaign_name,
-                    'efficiency_score': efficiency_score,
-                    'main_issue': main_issue,
-                    'severity': severity,
-                    'potential_savings': potential_savings,
-                    'recommendation': (
-                        f"Campaign '{campaign_name}' is performing below average (score: {efficiency_score:.0f}/100) "
-                        f"with {main_issue}. Consider reducing budget by 15% or optimizing targeting."
-                    )
-                }
-                results['recommendations'].append(recommendation)
+                severity = _SEVERITY_MEDIUM
+                potential_savings = spend * 0.15  # 15% of spend
+            
+            results['recommendations'].append({
+                'type': _TYPE_CAMPAIGN,
+                'campaign_id': campaign_id,
+                'campaign_name': campaign_name,
+                'efficiency_score': efficiency_score,
+                'main_issue': main_issue,
+                'severity': severity,
+                'potential_savings': potential_savings,
+                'recommendation': text
+            })
         
         return results
     
@@ -395,124 +538,99 @@ class BudgetOptimizer:
             'recommendations': []
         }
         
+        # Nothing to score if no ad set has enough data (lower threshold for ad sets)
+        ad_sets_df = ad_sets_df.reset_index(drop=True)
+        sufficient_data = ~(ad_sets_df['impressions'] < self.min_data_threshold / 2)
+        if not sufficient_data.any():
+            return results
+        
         # Group by campaign to compare ad sets within the same campaign
         campaign_groups = ad_sets_df.groupby('campaign_id')
         
-        for campaign_id, campaign_adsets in campaign_groups:
-            # Skip campaigns with only one ad set
-            if len(campaign_adsets) < 2:
-                continue
-            
-            campaign_name = campaign_adsets['campaign_name'].iloc[0] if 'campaign_name' in campaign_adsets.columns else f"Campaign {campaign_id}"
-            
-            # Calculate average metrics for this campaign
-            avg_metrics = {
-                'ctr': campaign_adsets['ctr'].mean(),
-                'cpm': campaign_adsets['cpm'].mean(),
-                'cpc': campaign_adsets['cpc'].mean(),
-                'conversion_rate': campaign_adsets['conversion_rate'].mean() if 'conversion_rate' in campaign_adsets.columns else None,
-                'cpa': campaign_adsets['cpa'].mean() if 'cpa' in campaign_adsets.columns else None
-            }
+        # Broadcast campaign averages back to each ad set
+        avg_metrics = {
+            'ctr': campaign_groups['ctr'].transform('mean'),
+            'cpm': campaign_groups['cpm'].transform('mean'),
+            'cpc': campaign_groups['cpc'].transform('mean'),
+            'conversion_rate': campaign_groups['conversion_rate'].transform('mean') if 'conversion_rate' in ad_sets_df.columns else None,
+            'cpa': campaign_groups['cpa'].transform('mean') if 'cpa' in ad_sets_df.columns else None
+        }
+        
+        # Skip campaigns with only one ad set and ad sets with insufficient data
+        eligible = (campaign_groups['campaign_id'].transform('size') >= 2) & sufficient_data
+        
+        # Keep campaign order, and ad set order within each campaign
+        rows = np.flatnonzero(eligible)
+        rows = rows[np.argsort(campaign_groups.ngroup().to_numpy()[rows], kind='stable')]
+        
+        campaign_ids = ad_sets_df['campaign_id'].iloc[rows]
+        if 'campaign_name' in ad_sets_df.columns:
+            # Name of the campaign as given on its first ad set
+            first_rows = self._first_row_positions(ad_sets_df['campaign_id'])
+            campaign_names = ad_sets_df['campaign_name'].to_numpy()[first_rows[rows].astype(np.int64)]
+        else:
+            campaign_names = "Campaign " + campaign_ids.astype(str)
+        
+        campaign_adsets = ad_sets_df.iloc[rows]
+        avg_metrics = {metric: avg.iloc[rows] if avg is not None else None
+                       for metric, avg in avg_metrics.items()}
+        
+        # Calculate relative performance for all ad sets at once
+        adset_ids = campaign_adsets['adset_id']
+        efficiency_df = self._build_efficiency_metrics(campaign_adsets, avg_metrics, {
+            'campaign_id': campaign_ids,
+            'campaign_name': campaign_names,
+            'adset_id': adset_ids,
+            'adset_name': (campaign_adsets['name'] if 'name' in campaign_adsets.columns
+                           else "Ad Set " + adset_ids.astype(str))
+        })
+        
+        # Calculate overall efficiency scores (0-100)
+        efficiency_df['efficiency_score'] = self._calculate_efficiency_score_vec(efficiency_df)
+        
+        # Add to metrics
+        results['metrics'] = efficiency_df.to_dict('records')
+        
+        # Only inefficient ad sets need recommendations
+        flagged = np.flatnonzero(efficiency_df['efficiency_score'].to_numpy() < 50)
+        flagged_rows = efficiency_df[['campaign_id', 'campaign_name', 'adset_id', 'adset_name',
+                                      'spend', 'efficiency_score']].iloc[flagged]
+        
+        # Build the recommendation texts for all flagged ad sets at once
+        main_issues = self._identify_main_issues_vec(efficiency_df.iloc[flagged])
+        subjects = ("Ad set '" + flagged_rows['adset_name'].astype(str) + "' in campaign '" +
+                    flagged_rows['campaign_name'].astype(str) + "' is ")
+        details = " (score: " + self._score_labels(flagged_rows['efficiency_score']) + "/100) with " + main_issues
+        texts = np.where(
+            flagged_rows['efficiency_score'] < 30,
+            subjects + "performing very poorly" + details +
+            ". Consider pausing this ad set and reallocating its budget to better-performing ad sets in this campaign.",
+            subjects + "underperforming" + details +
+            ". Consider reducing its budget by 25% or refining its audience targeting."
+        )
+        
+        for (campaign_id, campaign_name, adset_id, adset_name, spend, efficiency_score), main_issue, text in zip(
+                flagged_rows.itertuples(index=False, name=None), main_issues, texts):
+            # Generate recommendations for inefficient ad sets
+            if efficiency_score < 30:  # Very inefficient
+                severity = _SEVERITY_HIGH
+                potential_savings = spend * 0.5  # 50% of spend could be reallocated
+            elif efficiency_score < 50:  # Moderately inefficient
+                severity = _SEVERITY_MEDIUM
+                potential_savings = spend * 0.25  # 25% of spend
             
-            # Calculate relative performance for each ad set
-            for _, adset in campaign_adsets.iterrows():
-                # Skip ad sets with insufficient data
-                if adset['impressions'] < self.min_data_threshold / 2:  # Lower threshold for ad sets
-                    continue
-                
-                adset_id = adset['adset_id']
-                adset_name = adset.get('name', f"Ad Set {adset_id}")
-                
-                # Calculate efficiency metrics
-                efficiency_metrics = {
-                    'campaign_id': campaign_id,
-                    'campaign_name': campaign_name,
-                    'adset_id': adset_id,
-                    'adset_name': adset_name,
-                    'spend': adset['spend'],
-                    'impressions': adset['impressions'],
-                    'clicks': adset['clicks'],
-                    'conversions': adset['conversions'] if 'conversions' in adset else 0,
-                    'ctr': adset['ctr'],
-                    'cpm': adset['cpm'],
-                    'cpc': adset['cpc'],
-                    'ctr_index': (adset['ctr'] / avg_metrics['ctr']) * 100 if avg_metrics['ctr'] > 0 else 0,
-                    'cpm_index': (avg_metrics['cpm'] / adset['cpm']) * 100 if adset['cpm'] > 0 else 0,
-                    'cpc_index': (avg_metrics['cpc'] / adset['cpc']) * 100 if adset['cpc'] > 0 else 0
-                }
-                
-                # Add conversion metrics if available
-                if 'conversion_rate' in adset and avg_metrics['conversion_rate'] is not None:
-                    efficiency_metrics['conversion_rate'] = adset['conversion_rate']
-                    efficiency_metrics['cpa'] = adset['cpa'] if 'cpa' in adset else None
-                    
-                    if avg_metrics['conversion_rate'] > 0:
-                        efficiency_metrics['conversion_rate_index'] = (adset['conversion_rate'] / avg_metrics['conversion_rate']) * 100
-                    else:
-                        efficiency_metrics['conversion_rate_index'] = 0
-                        
-                    if 'cpa' in adset and avg_metrics['cpa'] is not None and adset['cpa'] > 0:
-                        efficiency_metrics['cpa_index'] = (avg_metrics['cpa'] / adset['cpa']) * 100
-                    else:
-                        efficiency_metrics['cpa_index'] = 0
-                
-                # Calculate overall efficiency score (0-100)
-                efficiency_score = self._calculate_efficiency_score(efficiency_metrics)
-                efficiency_metrics['efficiency_score'] = efficiency_score
-                
-                # Add to metrics
-                results['metrics'].append(efficiency_metrics)
-                
-                # Generate recommendations for inefficient ad sets
-                if efficiency_score < 30:  # Very inefficient
-                    severity = "high"
-                    potential_savings = adset['spend'] * 0.5  # 50% of spend could be reallocated
-                    
-                    # Determine main issue
-                    main_issue = self._identify_main_issue(efficiency_metrics)
-                    
-                    recommendation = {
-                        'type': 'adset_budget_inefficiency',
-                        'campaign_id': campaign_id,
-                        'campaign_name': campaign_name,
-                        'adset_id': adset_id,
-                        'adset_name': adset_name,
-                        'efficiency_score': efficiency_score,
-                        'main_issue': main_issue,
-                        'severity': severity,
-                        'potential_savings': potential_savings,
-                        'recommendation': (
-                            f"Ad set '{adset_name}' in campaign '{campaign_name}' is performing very poorly "
-                            f"(score: {efficiency_score:.0f}/100) with {main_issue}. Consider pausing this ad set "
-                            f"and reallocating its budget to better-performing ad sets in this campaign."
-                        )
-                    }
-                    results['recommendations'].append(recommendation)
-                    
-                elif efficiency_score < 50:  # Moderately inefficient
-                    severity = "medium"
-                    potential_savings = adset['spend'] * 0.25  # 25% of spend
-                    
-                    # Determine main issue
-                    main_issue = self._identify_main_issue(efficiency_metrics)
-                    
-                    recommendation = {
-                        'type': 'adset_budget_inefficiency',
-                        'campaign_id': campaign_id,
-                        'campaign_name': campaign_name,
-                        'adset_id': adset_id,
-                        'adset_name': adset_name,
-                        'efficiency_score': efficiency_score,
-                        'main_issue': main_issue,
-                        'severity': severity,
-                        'potential_savings': potential_savings,
-                        'recommendation': (
-                            f"Ad set '{adset_name}' in campaign '{campaign_name}' is underperforming "
-                            f"(score: {efficiency_score:.0f}/100) with {main_issue}. Consider reducing its budget "
-                            f"by 25% or refining its audience targeting."
-                        )
-                    }
-                    results['recommendations'].append(recommendation)
+            results['recommendations'].append({
+                'type': _TYPE_ADSET,
+                'campaign_id': campaign_id,
+                'campaign_name': campaign_name,
+                'adset_id': adset_id,
+                'adset_name': adset_name,
+                'efficiency_score': efficiency_score,
+                'main_issue': main_issue,
+                'severity': severity,
+                'potential_savings': potential_savings,
+                'recommendation': text
+            })
         
         return results
     
@@ -543,145 +661,225 @@ class BudgetOptimizer:
             group_col = 'campaign_id'
             group_name_col = 'campaign_name'
         
+        # Nothing to score if no ad has enough data (even lower threshold for ads)
+        ads_df = ads_df.reset_index(drop=True)
+        sufficient_data = ~(ads_df['impressions'] < self.min_data_threshold / 4)
+        if not sufficient_data.any():
+            return results
+        
         group_by = ads_df.groupby(group_col)
         
-        for group_id, group_ads in group_by:
-            # Skip groups with only one ad
-            if len(group_ads) < 2:
+        # Broadcast group averages back to each ad
+        avg_metrics = {
+            'ctr': group_by['ctr'].transform('mean'),
+            'cpm': group_by['cpm'].transform('mean'),
+            'cpc': group_by['cpc'].transform('mean'),
+            'conversion_rate': group_by['conversion_rate'].transform('mean') if 'conversion_rate' in ads_df.columns else None,
+            'cpa': group_by['cpa'].transform('mean') if 'cpa' in ads_df.columns else None
+        }
+        
+        # Find the best performing ad in each group (by conversion rate, or CTR when
+        # the group has no conversion rates)
+        best_rows = group_by['ctr'].transform('idxmax')
+        if 'conversion_rate' in ads_df.columns:
+            best_rows = group_by['conversion_rate'].transform('idxmax').fillna(best_rows)
+        
+        # Skip groups with only one ad (or no usable best ad) and ads with insufficient data
+        eligible = (group_by[group_col].transform('size') >= 2) & best_rows.notna() & sufficient_data
+        
+        # Keep group order, and ad order within each group
+        rows = np.flatnonzero(eligible)
+        rows = rows[np.argsort(group_by.ngroup().to_numpy()[rows], kind='stable')]
+        
+        group_ids = ads_df[group_col].iloc[rows]
+        if group_name_col in ads_df.columns:
+            # Name of the group as given on its first ad
+            first_rows = self._first_row_positions(ads_df[group_col])
+            group_names = ads_df[group_name_col].to_numpy()[first_rows[rows].astype(np.int64)]
+        else:
+            group_names = "Group " + group_ids.astype(str)
+        
+        best_rows = best_rows.to_numpy()[rows].astype(np.int64)
+        best_ad_ids = ads_df['ad_id'].to_numpy()[best_rows].tolist()
+        if 'name' in ads_df.columns:
+            best_ad_names = ads_df['name'].to_numpy()[best_rows].tolist()
+        else:
+            best_ad_names = ("Ad " + pd.Series(best_ad_ids).astype(str)).tolist()
+        
+        group_ads = ads_df.iloc[rows]
+        avg_metrics = {metric: avg.iloc[rows] if avg is not None else None
+                       for metric, avg in avg_metrics.items()}
+        
+        # Calculate efficiency metrics relative to group average for all ads at once
+        ad_ids = group_ads['ad_id']
+        efficiency_df = self._build_efficiency_metrics(group_ads, avg_metrics, {
+            'group_id': group_ids,
+            'group_name': group_names,
+            'ad_id': ad_ids,
+            'ad_name': group_ads['name'] if 'name' in group_ads.columns else "Ad " + ad_ids.astype(str)
+        })
+        
+        # Calculate overall efficiency scores (0-100)
+        efficiency_df['efficiency_score'] = self._calculate_efficiency_score_vec(efficiency_df)
+        
+        # Calculate comparison to best performing ad
+        if 'conversion_rate' in ads_df.columns:
+            best_cr = ads_df['conversion_rate'].to_numpy()[best_rows]
+            ad_cr = group_ads['conversion_rate'].to_numpy()
+            efficiency_df['conversion_rate_vs_best'] = self._relative_index(
+                ad_cr, best_cr, (best_cr > 0) & (ad_cr > 0))
+        
+        # Add to metrics
+        results['metrics'] = efficiency_df.to_dict('records')
+        
+        # Only inefficient ads with meaningful spend need recommendations
+        flagged = np.flatnonzero((efficiency_df['efficiency_score'].to_numpy() < 50) &
+                                 (efficiency_df['spend'] >= self.min_adset_spend / 4).to_numpy())
+        flagged_rows = efficiency_df[['group_id', 'group_name', 'ad_id', 'ad_name',
+                                      'spend', 'efficiency_score']].iloc[flagged]
+        flagged_best_ids = [best_ad_ids[i] for i in flagged]
+        flagged_best_names = pd.Series([best_ad_names[i] for i in flagged], index=flagged_rows.index, dtype=object)
+        
+        # Build the recommendation texts for all flagged ads at once
+        subjects = ("Ad '" + flagged_rows['ad_name'].astype(str) + f"' in {group_name_col} '" +
+                    flagged_rows['group_name'].astype(str) + "' is ")
+        details = " (score: " + self._score_labels(flagged_rows['efficiency_score']) + "/100). "
+        best_ad_refs = "the better-performing ad '" + flagged_best_names.astype(str) + "'."
+        texts = np.where(
+            flagged_rows['efficiency_score'] < 30,
+            subjects + "performing very poorly" + details +
+            "Pause this ad and reallocate its impressions to " + best_ad_refs,
+            subjects + "significantly underperforming" + details +
+            "Consider reducing its budget and testing new creative variations based on " + best_ad_refs
+        )
+        
+        for (group_id, group_name, ad_id, ad_name, spend, efficiency_score), best_ad_id, best_ad_name, text in zip(
+                flagged_rows.itertuples(index=False, name=None), flagged_best_ids, flagged_best_names, texts):
+            # Skip recommendations for the best performing ad
+            if ad_id == best_ad_id:
                 continue
             
-            group_name = group_ads[group_name_col].iloc[0] if group_name_col in group_ads.columns else f"Group {group_id}"
+            # Generate recommendations for inefficient ads
+            if efficiency_score < 30:
+                severity = _SEVERITY_HIGH
+                potential_savings = spend * 0.9  # 90% of spend could be saved
+            elif efficiency_score < 50:
+                severity = _SEVERITY_MEDIUM
+                potential_savings = spend * 0.5  # 50% of spend
             
-            # Calculate average metrics for this group
-            avg_metrics = {
-                'ctr': group_ads['ctr'].mean(),
-                'cpm': group_ads['cpm'].mean(),
-                'cpc': group_ads['cpc'].mean(),
-                'conversion_rate': group_ads['conversion_rate'].mean() if 'conversion_rate' in group_ads.columns else None,
-                'cpa': group_ads['cpa'].mean() if 'cpa' in group_ads.columns else None
-            }
+            results['recommendations'].append({
+                'type': _TYPE_AD,
+                'group_id': group_id,
+                'group_name': group_name,
+                'ad_id': ad_id,
+                'ad_name': ad_name,
+                'best_ad_id': best_ad_id,
+                'best_ad_name': best_ad_name,
+                'efficiency_score': efficiency_score,
+                'severity': severity,
+                'potential_savings': potential_savings,
+                'recommendation': text
+            })
+        
+        return results
+    
+    def _build_efficiency_metrics(self, df, avg_metrics, id_columns):
+        """
+        Calculate efficiency metrics relative to average performance for every row.
+        
+        Args:
+            df (DataFrame): Entity data with performance metrics
+            avg_metrics (dict): Average metrics to compare against, as scalars or
+                Series aligned with df
+            id_columns (dict): Leading identifier columns (Series, arrays or scalars)
+            
+        Returns:
+            DataFrame: Efficiency metrics, one row per entity
+        """
+        ctr = df['ctr']
+        cpm = df['cpm']
+        cpc = df['cpc']
+        
+        efficiency_df = pd.DataFrame({
+            **id_columns,
+            'spend': df['spend'],
+            'impressions': df['impressions'],
+            'clicks': df['clicks'],
+            'conversions': df['conversions'] if 'conversions' in df.columns else 0,
+            'ctr': ctr,
+            'cpm': cpm,
+            'cpc': cpc,
+            'ctr_index': self._relative_index(ctr, avg_metrics['ctr'], avg_metrics['ctr'] > 0),
+            'cpm_index': self._relative_index(avg_metrics['cpm'], cpm, cpm > 0),
+            'cpc_index': self._relative_index(avg_metrics['cpc'], cpc, cpc > 0)
+        }, index=df.index)
+        
+        # Add conversion metrics if available
+        if 'conversion_rate' in df.columns and avg_metrics['conversion_rate'] is not None:
+            conversion_rate = df['conversion_rate']
+            efficiency_df['conversion_rate'] = conversion_rate
+            efficiency_df['cpa'] = df['cpa'] if 'cpa' in df.columns else None
+            efficiency_df['conversion_rate_index'] = self._relative_index(
+                conversion_rate,
+                avg_metrics['conversion_rate'],
+                avg_metrics['conversion_rate'] > 0
+            )
             
-            # Find the best performing ad in this group (by conversion rate or CTR)
-            if 'conversion_rate' in group_ads.columns and not group_ads['conversion_rate'].isna().all():
-                best_ad_idx = group_ads['conversion_rate'].idxmax()
+            if 'cpa' in df.columns and avg_metrics['cpa'] is not None:
+                cpa = df['cpa']
+                efficiency_df['cpa_index'] = self._relative_index(avg_metrics['cpa'], cpa, cpa > 0)
             else:
-                best_ad_idx = group_ads['ctr'].idxmax()
-                
-            best_ad = group_ads.loc[best_ad_idx]
-            best_ad_id = best_ad['ad_id']
-            best_ad_name = best_ad.get('name', f"Ad {best_ad_id}")
+                efficiency_df['cpa_index'] = 0
+        
+        return efficiency_df
+    
+    def _score_labels(self, scores):
+        """
+        Format efficiency scores as whole numbers for recommendation texts.
+        
+        Args:
+            scores (Series): Efficiency scores
             
-            # Calculate relative performance for each ad
-            for _, ad in group_ads.iterrows():
-                # Skip ads with insufficient data
-                if ad['impressions'] < self.min_data_threshold / 4:  # Even lower threshold for ads
-                    continue
-                
-                ad_id = ad['ad_id']
-                ad_name = ad.get('name', f"Ad {ad_id}")
-                
-                # Calculate efficiency metrics relative to group average
-                efficiency_metrics = {
-                    'group_id': group_id,
-                    'group_name': group_name,
-                    'ad_id': ad_id,
-                    'ad_name': ad_name,
-                    'spend': ad['spend'],
-                    'impressions': ad['impressions'],
-                    'clicks': ad['clicks'],
-                    'conversions': ad['conversions'] if 'conversions' in ad else 0,
-                    'ctr': ad['ctr'],
-                    'cpm': ad['cpm'],
-                    'cpc': ad['cpc'],
-                    'ctr_index': (ad['ctr'] / avg_metrics['ctr']) * 100 if avg_metrics['ctr'] > 0 else 0,
-                    'cpm_index': (avg_metrics['cpm'] / ad['cpm']) * 100 if ad['cpm'] > 0 else 0,
-                    'cpc_index': (avg_metrics['cpc'] / ad['cpc']) * 100 if ad['cpc'] > 0 else 0
-                }
-                
-                # Add conversion metrics if available
-                if 'conversion_rate' in ad and avg_metrics['conversion_rate'] is not None:
-                    efficiency_metrics['conversion_rate'] = ad['conversion_rate']
-                    efficiency_metrics['cpa'] = ad['cpa'] if 'cpa' in ad else None
-                    
-                    if avg_metrics['conversion_rate'] > 0:
-                        efficiency_metrics['conversion_rate_index'] = (ad['conversion_rate'] / avg_metrics['conversion_rate']) * 100
-                    else:
-                        efficiency_metrics['conversion_rate_index'] = 0
-                        
-                    if 'cpa' in ad and avg_metrics['cpa'] is not None and ad['cpa'] > 0:
-                        efficiency_metrics['cpa_index'] = (avg_metrics['cpa'] / ad['cpa']) * 100
-                    else:
-                        efficiency_metrics['cpa_index'] = 0
-                
-                # Calculate overall efficiency score (0-100)
-                efficiency_score = self._calculate_efficiency_score(efficiency_metrics)
-                efficiency_metrics['efficiency_score'] = efficiency_score
-                
-                # Calculate comparison to best performing ad
-                if 'conversion_rate' in ad and 'conversion_rate' in best_ad:
-                    best_cr = best_ad['conversion_rate']
-                    ad_cr = ad['conversion_rate']
-                    if best_cr > 0 and ad_cr > 0:
-                        cr_vs_best = (ad_cr / best_cr) * 100
-                    else:
-                        cr_vs_best = 0
-                    efficiency_metrics['conversion_rate_vs_best'] = cr_vs_best
-                
-                # Add to metrics
-                results['metrics'].append(efficiency_metrics)
-                
-                # Skip recommendations for the best performing ad
-                if ad_id == best_ad_id:
-                    continue
-                
-                # Generate recommendations for inefficient ads
-                if efficiency_score < 30 and ad['spend'] >= self.min_adset_spend / 4:
-                    severity = "high"
-                    potential_savings = ad['spend'] * 0.9  # 90% of spend could be saved
-                    
-                    recommendation = {
-                        'type': 'ad_performance_inefficiency',
-                        'group_id': group_id,
-                        'group_name': group_name,
-                        'ad_id': ad_id,
-                        'ad_name': ad_name,
-                        'best_ad_id': best_ad_id,
-                        'best_ad_name': best_ad_name,
-                        'efficiency_score': efficiency_score,
-                        'severity': severity,
-                        'potential_savings': potential_savings,
-                        'recommendation': (
-                            f"Ad '{ad_name}' in {group_name_col} '{group_name}' is performing very poorly "
-                            f"(score: {efficiency_score:.0f}/100). Pause this ad and reallocate its impressions "
-                            f"to the better-performing ad '{best_ad_name}'."
-                        )
-                    }
-                    results['recommendations'].append(recommendation)
-                    
-                elif efficiency_score < 50 and ad['spend'] >= self.min_adset_spend / 4:
-                    severity = "medium"
-                    potential_savings = ad['spend'] * 0.5  # 50% of spend
-                    
-                    recommendation = {
-                        'type': 'ad_performance_inefficiency',
-                        'group_id': group_id,
-                        'group_name': group_name,
-                        'ad_id': ad_id,
-                        'ad_name': ad_name,
-                        'best_ad_id': best_ad_id,
-                        'best_ad_name': best_ad_name,
-                        'efficiency_score': efficiency_score,
-                        'severity': severity,
-                        'potential_savings': potential_savings,
-                        'recommendation': (
-                            f"Ad '{ad_name}' in {group_name_col} '{group_name}' is significantly underperforming "
-                            f"(score: {efficiency_score:.0f}/100). Consider reducing its budget and testing new creative "
-                            f"variations based on the better-performing ad '{best_ad_name}'."
-                        )
-                    }
-                    results['recommendations'].append(recommendation)
+        Returns:
+            Series: Scores rendered like f"{score:.0f}", aligned with the input
+        """
+        return pd.Series(np.char.mod('%.0f', scores.to_numpy(dtype=np.float64)),
+                         index=scores.index, dtype=object)
+    
+    def _relative_index(self, numerator, denominator, valid):
+        """
+        Express one metric as a percentage of another without materializing infinities.
         
-        return results
+        Args:
+            numerator (ndarray, Series or scalar): Metric being indexed
+            denominator (ndarray, Series or scalar): Reference metric
+            valid (ndarray, Series or bool): Where the ratio is defined
+            
+        Returns:
+            ndarray: numerator / denominator * 100 where valid, 0 elsewhere
+        """
+        numerator, denominator, valid = np.broadcast_arrays(
+            np.asarray(numerator, dtype=np.float64),
+            np.asarray(denominator, dtype=np.float64),
+            np.asarray(valid, dtype=bool)
+        )
+        result = np.zeros(valid.shape)
+        np.divide(numerator, denominator, out=result, where=valid)
+        return result * 100
+    
+    def _first_row_positions(self, keys):
+        """
+        Find the position of the first row of each row's group.
+        
+        Args:
+            keys (Series): Group key for each row
+            
+        Returns:
+            ndarray: Position of the group's first row for each row (NaN for missing keys)
+        """
+        positions = pd.Series(np.arange(len(keys)), index=keys.index)
+        first_positions = positions.groupby(keys.to_numpy()).transform('min').to_numpy()
+        return first_positions
     
     def _analyze_budget_allocation(self, data):
         """
@@ -702,69 +900,51 @@ class BudgetOptimizer:
         if campaigns_df.empty:
             return results
         
-        # Calculate total account spend
-        total_spend = campaigns_df['spend'].sum()
+        # Calculate total account spend (one array reused for every spend total below)
+        campaign_spend = campaigns_df['spend'].to_numpy()
+        total_spend = campaign_spend.sum()
         if total_spend == 0:
             return results
         
-        # Calculate spend distribution by performance
-        campaigns_df['spend_pct'] = (campaigns_df['spend'] / total_spend) * 100
-        
-        # Sort campaigns by efficiency (using CPA, conversion rate or CTR)
+        # Rank campaigns by efficiency (using CPA, conversion rate or CTR)
         if 'cpa' in campaigns_df.columns and not campaigns_df['cpa'].isna().all():
             # For CPA, lower is better so sort ascending
-            campaigns_df = campaigns_df.sort_values('cpa')
             perf_metric = 'cpa'
             better_is_lower = True
         elif 'conversion_rate' in campaigns_df.columns and not campaigns_df['conversion_rate'].isna().all():
             # For conversion rate, higher is better so sort descending
-            campaigns_df = campaigns_df.sort_values('conversion_rate', ascending=False)
             perf_metric = 'conversion_rate'
             better_is_lower = False
         else:
             # Fallback to CTR
-            campaigns_df = campaigns_df.sort_values('ctr', ascending=False)
             perf_metric = 'ctr'
             better_is_lower = False
         
-        # Calculate cumulative spend percentage
-        campaigns_df['cumulative_spend_pct'] = campaigns_df['spend_pct'].cumsum()
-        
-        # Split into quartiles
-        quartile_spend = {}
-        
-        # Top 25% of campaigns by performance
-        top_25 = campaigns_df[campaigns_df['cumulative_spend_pct'] <= 25]
-        quartile_spend['top_25'] = {
-            'spend': top_25['spend'].sum(),
-            'spend_pct': (top_25['spend'].sum() / total_spend) * 100,
-            'campaign_count': len(top_25)
-        }
-        
-        # Mid-high 25-50% of campaigns
-        mid_high = campaigns_df[(campaigns_df['cumulative_spend_pct'] > 25) & 
-                               (campaigns_df['cumulative_spend_pct'] <= 50)]
-        quartile_spend['mid_high'] = {
-            'spend': mid_high['spend'].sum(),
-            'spend_pct': (mid_high['spend'].sum() / total_spend) * 100,
-            'campaign_count': len(mid_high)
-        }
-        
-        # Mid-low 50-75% of campaigns
-        mid_low = campaigns_df[(campaigns_df['cumulative_spend_pct'] > 50) & 
-                              (campaigns_df['cumulative_spend_pct'] <= 75)]
-        quartile_spend['mid_low'] = {
-            'spend': mid_low['spend'].sum(),
-            'spend_pct': (mid_low['spend'].sum() / total_spend) * 100,
-            'campaign_count': len(mid_low)
-        }
-        
-        # Bottom 25% of campaigns
-        bottom_25 = campaigns_df[campaigns_df['cumulative_spend_pct'] > 75]
-        quartile_spend['bottom_25'] = {
-            'spend': bottom_25['spend'].sum(),
-            'spend_pct': (bottom_25['spend'].sum() / total_spend) * 100,
-            'campaign_count': len(bottom_25)
+        # Only spend is needed in performance order, so sort positions rather than the
+        # whole frame (stable, missing metrics last)
+        perf_values = campaigns_df[perf_metric].to_numpy(dtype=np.float64)
+        order = np.argsort(perf_values if better_is_lower else -perf_values, kind='stable')
+        
+        # Calculate cumulative spend percentage (in performance order)
+        spend = campaign_spend[order]
+        cumulative_spend_pct = np.cumsum((spend / total_spend) * 100)
+        
+        # Split into quartiles of cumulative spend, from the best performers (top 25%)
+        # through mid-high (25-50%) and mid-low (50-75%) to the worst (bottom 25%)
+        quartile_names = ('top_25', 'mid_high', 'mid_low', 'bottom_25')
+        quartiles = np.searchsorted([25, 50, 75], cumulative_spend_pct, side='left')
+        
+        # Total every quartile in a single pass over spend
+        quartile_totals = np.bincount(quartiles, weights=spend, minlength=4).astype(spend.dtype)
+        quartile_counts = np.bincount(quartiles, minlength=4)
+        
+        quartile_spend = {
+            name: {
+                'spend': quartile_totals[q],
+                'spend_pct': (quartile_totals[q] / total_spend) * 100,
+                'campaign_count': int(quartile_counts[q])
+            }
+            for q, name in enumerate(quartile_names)
         }
         
         results['distribution'] = {
@@ -774,13 +954,14 @@ class BudgetOptimizer:
         }
         
         # Check for allocation inefficiency
+        bottom_spend = quartile_totals[3]
         bottom_spend_pct = quartile_spend['bottom_25']['spend_pct']
         top_spend_pct = quartile_spend['top_25']['spend_pct']
         
         if bottom_spend_pct > top_spend_pct * 1.5:
             # Significant overspend on bottom performers
-            severity = "high"
-            potential_savings = bottom_25['spend'].sum() * 0.5  # 50% of bottom quartile spend
+            severity = _SEVERITY_HIGH
+            potential_savings = bottom_spend * 0.5  # 50% of bottom quartile spend
             
             if better_is_lower:
                 metric_desc = f"highest {perf_metric}"
@@ -788,7 +969,7 @@ class BudgetOptimizer:
                 metric_desc = f"lowest {perf_metric}"
             
             recommendation = {
-                'type': 'budget_allocation_imbalance',
+                'type': _TYPE_ALLOCATION,
                 'performance_metric': perf_metric,
                 'bottom_spend_pct': bottom_spend_pct,
                 'top_spend_pct': top_spend_pct,
@@ -804,8 +985,8 @@ class BudgetOptimizer:
             
         elif bottom_spend_pct > top_spend_pct * 1.2:
             # Moderate overspend on bottom performers
-            severity = "medium"
-            potential_savings = bottom_25['spend'].sum() * 0.3  # 30% of bottom quartile spend
+            severity = _SEVERITY_MEDIUM
+            potential_savings = bottom_spend * 0.3  # 30% of bottom quartile spend
             
             if better_is_lower:
                 metric_desc = f"higher {perf_metric}"
@@ -813,7 +994,7 @@ class BudgetOptimizer:
                 metric_desc = f"lower {perf_metric}"
             
             recommendation = {
-                'type': 'budget_allocation_imbalance',
+                'type': _TYPE_ALLOCATION,
                 'performance_metric': perf_metric,
                 'bottom_spend_pct': bottom_spend_pct,
                 'top_spend_pct': top_spend_pct,
@@ -829,97 +1010,110 @@ class BudgetOptimizer:
         
         return results
     
-    def _calculate_efficiency_score(self, metrics):
+    # Weights of the index metrics in the efficiency score
+    _SCORE_WEIGHTS = {
+        'ctr_index': 0.15,
+        'cpm_index': 0.15,
+        'cpc_index': 0.2,
+        'conversion_rate_index': 0.25,
+        'cpa_index': 0.25
+    }
+    _SCORE_WEIGHT_VALUES = np.array(list(_SCORE_WEIGHTS.values()))
+    
+    # For CPA, lower is better, so the index is already properly scaled
+    _SCORE_HIGHER_IS_BETTER = np.array([metric != 'cpa_index' for metric in _SCORE_WEIGHTS])
+    
+    def _calculate_efficiency_score_vec(self, df):
         """
-        Calculate an overall efficiency score from 0-100.
+        Calculate overall efficiency scores from 0-100 for every row at once.
         
         Args:
-            metrics (dict): Performance metrics for the entity
+            df (DataFrame): Performance metrics, one row per entity
             
         Returns:
-            float: Efficiency score (0-100)
-        """
-        # Weights for different metrics
-        weights = {
-            'ctr_index': 0.15,
-            'cpm_index': 0.15,
-            'cpc_index': 0.2,
-            'conversion_rate_index': 0.25,
-            'cpa_index': 0.25
-        }
+            ndarray: Efficiency score (0-100) for each row
+        """
+        indices = np.column_stack([
+            df[metric].to_numpy(dtype=np.float64) if metric in df.columns else np.full(len(df), np.nan)
+            for metric in self._SCORE_WEIGHTS
+        ])
+        return self._score_indices(indices)
+    
+    def _score_indices(self, indices):
+        """
+        Calculate efficiency scores from a matrix of performance indices.
         
-        # Start with base score
-        score = 50.0
-        weight_sum = 0
-        
-        # Add weighted components
-        for metric, weight in weights.items():
-            if metric in metrics and not pd.isna(metrics[metric]) and metrics[metric] > 0:
-                # For indices, 100 is the baseline (average performance)
-                # We want to reward above average and penalize below average
-                metric_score = metrics[metric]
-                
-                # Cap extreme values to avoid oversized impact
-                if metric_score > 200:
-                    metric_score = 200
-                    
-                # Convert to 0-100 scale
-                if metric == 'cpa_index':
-                    # For CPA, lower is better, so the score is already properly scaled
-                    pass
-                else:
-                    # For other metrics, higher is better, but we want 100 to be baseline
-                    metric_score = (metric_score / 2) + 50
-                
-                score += (metric_score - 50) * weight
-                weight_sum += weight
+        Args:
+            indices (ndarray): One row per entity, columns in _SCORE_WEIGHTS order (NaN if missing)
+            
+        Returns:
+            ndarray: Efficiency score (0-100) for each row
+        """
+        weight_values = self._SCORE_WEIGHT_VALUES
+        higher_is_better = self._SCORE_HIGHER_IS_BETTER
+        
+        if _score_kernel is not None:
+            return _score_kernel(indices, weight_values, higher_is_better)
+        
+        # Score every metric of every entity in one pass
+        valid = ~np.isnan(indices) & (indices > 0)
+        
+        # For indices, 100 is the baseline (average performance)
+        # We want to reward above average and penalize below average
+        # Cap extreme values to avoid oversized impact
+        metric_scores = np.minimum(indices, 200)
+        
+        # Convert to 0-100 scale; for all but CPA, higher is better with 100 as baseline
+        metric_scores = np.where(higher_is_better, (metric_scores / 2) + 50, metric_scores)
+        
+        # Base score of 50 plus the weighted components (summed left to right)
+        contributions = np.where(valid, (metric_scores - 50) * weight_values, 0.0)
+        score = np.column_stack([np.full(len(indices), 50.0), contributions]).sum(axis=1)
+        weight_sum = np.where(valid, weight_values, 0.0).sum(axis=1)
         
         # If we didn't have enough metrics, adjust the base score
-        if weight_sum < 0.5:
-            # Not enough data for a reliable score, revert closer to baseline
-            score = score * (weight_sum * 2) + 50 * (1 - (weight_sum * 2))
+        # Not enough data for a reliable score, revert closer to baseline
+        score = np.where(weight_sum < 0.5, score * (weight_sum * 2) + 50 * (1 - (weight_sum * 2)), score)
         
         # Ensure score is within 0-100 range
-        score = max(0, min(100, score))
-        
-        return score
+        return np.clip(score, 0, 100)
+    
+    # Performance issues checked by _identify_main_issues_vec, in reporting order:
+    # (index column, value column, description template)
+    _ISSUE_CHECKS = (
+        ('ctr_index', 'ctr', "low CTR ({:.2f}% vs. average)"),
+        ('cpm_index', 'cpm', "high CPM (${:.2f} vs. average)"),
+        ('cpc_index', 'cpc', "high CPC (${:.2f} vs. average)"),
+        ('conversion_rate_index', 'conversion_rate', "low conversion rate ({:.2f}% vs. average)"),
+        ('cpa_index', 'cpa', "high CPA (${:.2f} vs. average)")
+    )
     
-    def _identify_main_issue(self, metrics):
+    def _identify_main_issues_vec(self, df):
         """
-        Identify the main performance issue for an entity.
+        Identify the main performance issue for every row at once.
         
         Args:
-            metrics (dict): Performance metrics
+            df (DataFrame): Efficiency metrics, one row per entity
             
         Returns:
-            str: Description of the main issue
+            Series: Description of each row's main issue, aligned with df
         """
-        issues = []
+        issues = pd.Series("overall performance below average", index=df.index, dtype=object)
         
-        # Check CTR
-        if 'ctr_index' in metrics and metrics['ctr_index'] < 70:
-            issues.append(f"low CTR ({metrics['ctr']:.2f}% vs. average)")
+        issue_checks = [check for check in self._ISSUE_CHECKS if check[0] in df.columns]
+        if not issue_checks or df.empty:
+            return issues
         
-        # Check CPM
-        if 'cpm_index' in metrics and metrics['cpm_index'] < 70:
-            issues.append(f"high CPM (${metrics['cpm']:.2f} vs. average)")
+        # Flag every check for every row, then only format rows with issues
+        low = np.column_stack([df[index_col].to_numpy(dtype=np.float64) < 70
+                               for index_col, _, _ in issue_checks])
         
-        # Check CPC
-        if 'cpc_index' in metrics and metrics['cpc_index'] < 70:
-            issues.append(f"high CPC (${metrics['cpc']:.2f} vs. average)")
+        for row in np.flatnonzero(low.any(axis=1)):
+            # Report the first two issues
+            found = []
+            for j in np.flatnonzero(low[row])[:2]:
+                _, value_col, template = issue_checks[j]
+                found.append(template.format(df[value_col].iat[row]))
+            issues.iat[row] = found[0] if len(found) == 1 else f"{found[0]} and {found[1]}"
         
-        # Check conversion rate
-        if 'conversion_rate_index' in metrics and metrics['conversion_rate_index'] < 70:
-            issues.append(f"low conversion rate ({metrics['conversion_rate']:.2f}% vs. average)")
-        
-        # Check CPA
-        if 'cpa_index' in metrics and metrics['cpa_index'] < 70:
-            issues.append(f"high CPA (${metrics['cpa']:.2f} vs. average)")
-        
-        if not issues:
-            return "overall performance below average"
-        elif len(issues) == 1:
-            return issues[0]
-        else:
-            # Return the first two issues
-            return f"{issues[0]} and {issues[1]}"
\ No newline at end of file
+        return issues
\ No newline at end of file
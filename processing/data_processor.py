@@ -7,6 +7,37 @@ from processing.insights import generate_insights, prioritize_recommendations
 
 logger = logging.getLogger(__name__)
 
+# Known numeric columns per entity type, applied when a column is inferred as object
+# (e.g. numbers delivered as strings) so downstream math hits numeric dtypes
+ENTITY_DTYPES = {
+    'campaigns': {'daily_budget': 'float64', 'lifetime_budget': 'float64', 'budget': 'float64'},
+    'ad_sets': {'daily_budget': 'float64', 'lifetime_budget': 'float64', 'budget': 'float64'},
+    'ad_groups': {'budget': 'float64'},
+    'insights': {
+        'spend': 'float64',
+        'impressions': 'int64',
+        'clicks': 'int64',
+        'reach': 'int64',
+        'frequency': 'float64',
+        'conversions': 'float64'
+    }
+}
+
+# Entity attributes carried onto insights rows by the dimension joins; anything
+# else on the entity tables stays there instead of being copied per insight row
+NEEDED_COLS = {
+    'campaigns': ['id', 'name', 'status', 'objective', 'daily_budget', 'lifetime_budget', 'budget'],
+    'ad_sets': ['id', 'campaign_id', 'name', 'status', 'daily_budget', 'lifetime_budget', 'budget'],
+    'ad_groups': ['id', 'campaign_id', 'name', 'status', 'budget'],
+    'ads': ['id', 'campaign_id', 'adset_id', 'ad_group_id', 'name', 'status', 'creative_id', 'creative_name']
+}
+
+# Entity lists longer than this are converted to a DataFrame column by column
+LARGE_ENTITY_ROWS = 50000
+
+# Date format the platform APIs report insight dates in
+DATE_FORMAT = '%Y-%m-%d'
+
 class AdDataProcessor:
     """
     Advanced data processing engine for ad account data analysis.
@@ -85,7 +116,7 @@ class AdDataProcessor:
         else:
             # Generic processing for other platforms
             for entity_type, entities in data.items():
-                processed[entity_type] = pd.DataFrame(entities)
+                processed[entity_type] = self._entity_frame(entity_type, entities)
                 
         # Add platform identifier to processed data
         processed['platform'] = platform
@@ -100,14 +131,14 @@ class AdDataProcessor:
         for entity_type in ['campaigns', 'ad_sets', 'ads', 'insights']:
             if entity_type in data and data[entity_type]:
                 try:
-                    df = pd.DataFrame(data[entity_type])
+                    df = self._entity_frame(entity_type, data[entity_type])
                     
                     # Handle special fields
                     if entity_type == 'insights':
                         # Convert date strings to datetime with error handling
                         if 'date' in df.columns:
                             try:
-                                df['date'] = pd.to_datetime(df['date'], errors='coerce')
+                                df['date'] = self._parse_dates(df['date'], errors='coerce')
                                 # Log any parsing errors
                                 if df['date'].isna().any():
                                     logger.warning(f"Some dates could not be parsed in {entity_type}")
@@ -118,10 +149,7 @@ class AdDataProcessor:
                         # Extract actions (conversions, etc.) with error handling
                         if 'actions' in df.columns:
                             try:
-                                df['purchases'] = df['actions'].apply(
-                                    lambda x: sum(a.get('value', 0) for a in x if a.get('action_type') == 'purchase')
-                                    if isinstance(x, list) else 0
-                                )
+                                df['purchases'] = self._extract_purchases(df['actions'])
                             except Exception as e:
                                 logger.error(f"Error processing actions in {entity_type}: {str(e)}")
                                 df['purchases'] = 0
@@ -180,45 +208,24 @@ class AdDataProcessor:
                 if 'campaigns' in processed and not processed['campaigns'].empty:
                     if 'campaign_id' in insights_df.columns and 'id' in processed['campaigns'].columns:
                         campaigns_df = processed['campaigns']
-                        insights_df = pd.merge(
-                            insights_df, 
-                            campaigns_df,
-                            left_on='campaign_id',
-                            right_on='id',
-                            how='left',
-                            suffixes=('', '_campaign')
-                        )
+                        insights_df = self._join_dimension(insights_df, campaigns_df, 'campaigns', 'campaign_id', '_campaign')
                 
                 # Join with ad sets
                 if 'ad_sets' in processed and not processed['ad_sets'].empty:
                     if 'adset_id' in insights_df.columns and 'id' in processed['ad_sets'].columns:
                         ad_sets_df = processed['ad_sets']
-                        insights_df = pd.merge(
-                            insights_df, 
-                            ad_sets_df,
-                            left_on='adset_id',
-                            right_on='id',
-                            how='left',
-                            suffixes=('', '_adset')
-                        )
+                        insights_df = self._join_dimension(insights_df, ad_sets_df, 'ad_sets', 'adset_id', '_adset')
                 
                 # Join with ads
                 if 'ads' in processed and not processed['ads'].empty:
                     if 'ad_id' in insights_df.columns and 'id' in processed['ads'].columns:
                         ads_df = processed['ads']
-                        insights_df = pd.merge(
-                            insights_df, 
-                            ads_df,
-                            left_on='ad_id',
-                            right_on='id',
-                            how='left',
-                            suffixes=('', '_ad')
-                        )
+                        insights_df = self._join_dimension(insights_df, ads_df, 'ads', 'ad_id', '_ad')
                 
                 # Update insights with joined data
                 processed['insights'] = insights_df
                 
-                # Create a master dataset with all joined data
+                # The master dataset is the joined insights frame itself (an alias, not a copy)
                 processed['master'] = insights_df
                 
             except Exception as e:
@@ -227,6 +234,108 @@ class AdDataProcessor:
         
         return processed
     
+    def _entity_frame(self, entity_type, entities):
+        """
+        Build a DataFrame from entity records, typing known numeric columns.
+        
+        Args:
+            entity_type (str): Entity type key (e.g. 'campaigns', 'insights')
+            entities (list): Entity records (dicts)
+            
+        Returns:
+            DataFrame: Entity data
+        """
+        if not isinstance(entities, list):
+            return pd.DataFrame(entities)
+        
+        if len(entities) > LARGE_ENTITY_ROWS and all(isinstance(row, dict) for row in entities):
+            # Build one typed column at a time so only a single column of Python
+            # objects is alive at once, instead of a full row-major object matrix
+            columns = dict.fromkeys(col for row in entities for col in row)
+            df = pd.DataFrame(
+                {col: pd.Series([row.get(col, np.nan) for row in entities]) for col in columns},
+                copy=False
+            )
+        else:
+            df = pd.DataFrame.from_records(entities)
+        
+        for col, dtype in ENTITY_DTYPES.get(entity_type, {}).items():
+            if col in df.columns and df[col].dtype == object:
+                try:
+                    df[col] = df[col].astype(dtype)
+                except (TypeError, ValueError):
+                    # Mixed or missing values; leave the column as it was
+                    pass
+        
+        return df
+    
+    def _parse_dates(self, dates, errors='raise'):
+        """
+        Parse date strings, using the fixed ISO format fast path when it fits.
+        
+        Args:
+            dates (Series): Raw date values
+            errors (str): pandas error handling for the general parser fallback
+            
+        Returns:
+            Series: Parsed datetime values
+        """
+        parsed = pd.to_datetime(dates, format=DATE_FORMAT, cache=True, errors='coerce')
+        
+        # Anything the fixed format could not read goes through the general parser
+        if (parsed.isna() & dates.notna()).any():
+            return pd.to_datetime(dates, cache=True, errors=errors)
+        
+        return parsed
+    
+    def _extract_purchases(self, actions):
+        """
+        Total the purchase action values of each insights row.
+        
+        Args:
+            actions (Series): Lists of action dicts with 'action_type' and 'value'
+            
+        Returns:
+            Series: Purchase value per row (0 where there are none), aligned with actions
+        """
+        # One row per action, keeping the index of the insights row it came from
+        exploded = actions[actions.map(lambda x: isinstance(x, list))].explode().dropna()
+        action_rows = pd.DataFrame(exploded.tolist(), columns=['action_type', 'value'], index=exploded.index)
+        
+        purchase_rows = action_rows[action_rows['action_type'].to_numpy() == 'purchase']
+        values = pd.to_numeric(purchase_rows['value'], errors='coerce').fillna(0)
+        
+        return values.groupby(level=0).sum().reindex(actions.index, fill_value=0)
+    
+    def _join_dimension(self, insights_df, dimension_df, entity_type, key, suffix):
+        """
+        Left-join entity attributes onto insights rows by entity ID.
+        
+        A left merge of insights_df[key] against dimension_df['id'], restricted
+        to the entity's NEEDED_COLS.
+        
+        Args:
+            insights_df (DataFrame): Insights rows
+            dimension_df (DataFrame): Entity table with an 'id' column
+            entity_type (str): Entity type key (e.g. 'campaigns', 'ads')
+            key (str): Insights column holding the entity ID
+            suffix (str): Suffix for entity columns that clash with insights columns
+            
+        Returns:
+            DataFrame: Insights with the entity columns appended
+        """
+        needed = NEEDED_COLS[entity_type]
+        dimension_df = dimension_df[[col for col in dimension_df.columns if col in needed]]
+        
+        return pd.merge(
+            insights_df,
+            dimension_df,
+            left_on=key,
+            right_on='id',
+            how='left',
+            suffixes=('', suffix)
+        )
+    
     def _process_tiktok_data(self, data):
         """Process TikTok specific data structure"""
         processed = {}
@@ -234,13 +343,13 @@ class AdDataProcessor:
         # Convert each entity to DataFrame
         for entity_type in ['campaigns', 'ad_groups', 'ads', 'insights']:
             if entity_type in data and data[entity_type]:
-                df = pd.DataFrame(data[entity_type])
+                df = self._entity_frame(entity_type, data[entity_type])
                 
                 # Handle TikTok-specific data structures
                 if entity_type == 'insights':
                     # Convert date strings to datetime
                     if 'date' in df.columns:
-                        df['date'] = pd.to_datetime(df['date'])
+                        df['date'] = self._parse_dates(df['date'])
                 
                 processed[entity_type] = df
         
@@ -252,45 +361,24 @@ class AdDataProcessor:
             if 'campaigns' in processed and not processed['campaigns'].empty:
                 if 'campaign_id' in insights_df.columns and 'id' in processed['campaigns'].columns:
                     campaigns_df = processed['campaigns']
-                    insights_df = pd.merge(
-                        insights_df, 
-                        campaigns_df,
-                        left_on='campaign_id',
-                        right_on='id',
-                        how='left',
-                        suffixes=('', '_campaign')
-                    )
+                    insights_df = self._join_dimension(insights_df, campaigns_df, 'campaigns', 'campaign_id', '_campaign')
             
             # Join with ad groups
             if 'ad_groups' in processed and not processed['ad_groups'].empty:
                 if 'ad_group_id' in insights_df.columns and 'id' in processed['ad_groups'].columns:
                     ad_groups_df = processed['ad_groups']
-                    insights_df = pd.merge(
-                        insights_df, 
-                        ad_groups_df,
-                        left_on='ad_group_id',
-                        right_on='id',
-                        how='left',
-                        suffixes=('', '_adgroup')
-                    )
+                    insights_df = self._join_dimension(insights_df, ad_groups_df, 'ad_groups', 'ad_group_id', '_adgroup')
             
             # Join with ads
             if 'ads' in processed and not processed['ads'].empty:
                 if 'ad_id' in insights_df.columns and 'id' in processed['ads'].columns:
                     ads_df = processed['ads']
-                    insights_df = pd.merge(
-                        insights_df, 
-                        ads_df,
-                        left_on='ad_id',
-                        right_on='id',
-                        how='left',
-                        suffixes=('', '_ad')
-                    )
+                    insights_df = self._join_dimension(insights_df, ads_df, 'ads', 'ad_id', '_ad')
             
             # Update insights with joined data
             processed['insights'] = insights_df
             
-            # Create a master dataset with all joined data
+            # The master dataset is the joined insights frame itself (an alias, not a copy)
             processed['master'] = insights_df
         
         return processed
@@ -306,16 +394,17 @@ class AdDataProcessor:
         
         # Compare CPA, CTR, etc. across platforms
         for metric in ['ctr', 'cpc', 'cpm', 'conversion_rate', 'roas']:
-            platform_values = {}
-            
-            for platform, metrics in self.metrics.items():
-                if metric in metrics:
-                    platform_values[platform] = metrics[metric]
+            platforms = [platform for platform, metrics in self.metrics.items() if metric in metrics]
+            values = [self.metrics[platform][metric] for platform in platforms]
             
-            if len(platform_values) > 1:
+            if len(platforms) > 1:
                 # Find best and worst performing platforms for this metric
-                best_platform = max(platform_values.items(), key=lambda x: x[1])
-                worst_platform = min(platform_values.items(), key=lambda x: x[1])
+                # (argmax/argmin return the first extreme, like max/min)
+                value_array = np.asarray(values, dtype=float)
+                best_idx = int(np.argmax(value_array))
+                worst_idx = int(np.argmin(value_array))
+                best_platform = (platforms[best_idx], values[best_idx])
+                worst_platform = (platforms[worst_idx], values[worst_idx])
                 
                 # Calculate the difference
                 difference_pct = ((best_platform[1] - worst_platform[1]) / worst_platform[1]) * 100 if worst_platform[1] != 0 else 0
@@ -381,19 +470,14 @@ class AdDataProcessor:
         Returns:
             dict: Aggregated performance metrics
         """
-        overall_metrics = {
-            'spend': 0,
-            'impressions': 0,
-            'clicks': 0,
-            'conversions': 0,
-            'revenue': 0
-        }
+        core_metrics = ['spend', 'impressions', 'clicks', 'conversions', 'revenue']
         
-        # Sum up core metrics across platforms
-        for platform, metrics in self.metrics.items():
-            for key in overall_metrics:
-                if key in metrics:
-                    overall_metrics[key] += metrics[key]
+        # Sum up core metrics across platforms, one column reduction per metric
+        platform_metrics = pd.DataFrame(
+            [{key: metrics.get(key, 0) for key in core_metrics} for metrics in self.metrics.values()],
+            columns=core_metrics
+        )
+        overall_metrics = {key: platform_metrics[key].sum() for key in core_metrics}
         
         # Calculate derived metrics
         if overall_metrics['impressions'] > 0:
@@ -1,68 +1,368 @@
 import numpy as np
 import pandas as pd
-from scipy import stats
+from scipy import special
 from datetime import datetime, timedelta
 
-def detect_ad_fatigue(ad_daily_data, min_days=5, confidence_threshold=0.90):
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; trend sums fall back to NumPy
+    NUMBA_AVAILABLE = False
+
+# Guards the t-statistic against r == +/-1, as in scipy.stats.linregress
+_TINY = 1.0e-20
+
+# Confidence scales with the days running, up to the full factor at 14 days;
+# the factor for each day count is looked up rather than recomputed per ad
+_FULL_CONFIDENCE_DAYS = 14
+_DAY_FACTORS = tuple(min(1.0, days / _FULL_CONFIDENCE_DAYS) for days in range(_FULL_CONFIDENCE_DAYS + 1))
+
+# Fatigue signals, as (metric, flag within it); a None flag means the metric is the flag
+_FATIGUE_SIGNALS = (
+    ('ctr_regression', 'significant_decline'),
+    ('negative_frequency_correlation', None),
+    ('conversion_regression', 'significant_decline'),
+    ('cpc_regression', 'significant_increase'),
+    ('accelerating_decline', None)
+)
+
+def _moment_rows(offsets, xs, ys, use):
     """
-    Enhanced ad fatigue detection using statistical analysis and regression.
+    Per-group means and centered second moments kernel over contiguous groups.
+    
+    All series are accumulated together, in one sweep over a group's rows for
+    the means and one for the deviations.
     
     Args:
-        ad_daily_data (DataFrame): Daily ad performance data with columns:
-            - date: Date of the data point
-            - ad_id: Identifier for the ad
-            - ad_name: Name of the ad
-            - impressions: Number of impressions
-            - clicks: Number of clicks
-            - ctr: Click-through rate (percentage)
-            - frequency: Average impression frequency
-            - spend: Amount spent
-            - conversions: Number of conversions (if available)
-        min_days (int): Minimum number of days required for analysis
-        confidence_threshold (float): Statistical confidence threshold (0-1)
+        offsets (ndarray): Start row of each group, followed by the total row count
+        xs (ndarray): Independent variables, one column per series
+        ys (ndarray): Dependent variables, one column per series
+        use (ndarray): Whether each observation counts towards its series
         
     Returns:
-        dict: Fatigue analysis results with metrics and confidence scores
+        ndarray: Per group and series: count, x mean, y mean, ssxm, ssxym, ssym
+    """
+    n_groups = len(offsets) - 1
+    n_series = xs.shape[1]
+    moments = np.zeros((n_groups, n_series, 6))
+    
+    for g in range(n_groups):
+        start = offsets[g]
+        end = offsets[g + 1]
+        m = moments[g]
+        
+        for i in range(start, end):
+            for s in range(n_series):
+                if use[i, s]:
+                    m[s, 0] += 1.0
+                    m[s, 1] += xs[i, s]
+                    m[s, 2] += ys[i, s]
+        
+        for s in range(n_series):
+            if m[s, 0] == 0:
+                m[s, 1:] = np.nan
+            else:
+                m[s, 1] /= m[s, 0]
+                m[s, 2] /= m[s, 0]
+        
+        for i in range(start, end):
+            for s in range(n_series):
+                if use[i, s]:
+                    dx = xs[i, s] - m[s, 1]
+                    dy = ys[i, s] - m[s, 2]
+                    m[s, 3] += dx * dx
+                    m[s, 4] += dx * dy
+                    m[s, 5] += dy * dy
+        
+        for s in range(n_series):
+            if m[s, 0] > 0:
+                m[s, 3] /= m[s, 0]
+                m[s, 4] /= m[s, 0]
+                m[s, 5] /= m[s, 0]
+    
+    return moments
+
+# Compiled on first use and cached on disk, so importing the module stays cheap
+_moment_kernel = njit(cache=True)(_moment_rows) if NUMBA_AVAILABLE else None
+
+def _group_moments(groups, n_groups, xs, ys, use):
+    """
+    Per-group means and average squared deviations of several (x, y) series.
+    
+    Args:
+        groups (ndarray): Group number (0 to n_groups - 1) of each observation,
+            in contiguous ascending runs
+        n_groups (int): Number of groups
+        xs (ndarray): Independent variables, one float64 column per series
+        ys (ndarray): Dependent variables, one float64 column per series
+        use (ndarray): Whether each observation counts towards its series
+        
+    Returns:
+        ndarray: Per series, the per-group arrays (counts, x_mean, y_mean, ssxm,
+            ssxym, ssym)
     """
-    results = {
+    if _moment_kernel is not None:
+        # Fixed argument types and layouts, so one compiled specialization serves every call
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=n_groups)))).astype(np.intp)
+        return _moment_kernel(offsets, np.ascontiguousarray(xs), np.ascontiguousarray(ys),
+                              np.ascontiguousarray(use)).transpose(1, 2, 0)
+    
+    moments = np.empty((xs.shape[1], 6, n_groups))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for s in range(xs.shape[1]):
+            rows = use[:, s]
+            series_groups = groups[rows]
+            x = xs[rows, s]
+            y = ys[rows, s]
+            
+            counts = np.bincount(series_groups, minlength=n_groups)
+            x_mean = np.bincount(series_groups, weights=x, minlength=n_groups) / counts
+            y_mean = np.bincount(series_groups, weights=y, minlength=n_groups) / counts
+            
+            # Average sums of squared deviations from the group means
+            dx = x - x_mean[series_groups]
+            dy = y - y_mean[series_groups]
+            moments[s] = (
+                counts,
+                x_mean,
+                y_mean,
+                np.bincount(series_groups, weights=dx * dx, minlength=n_groups) / counts,
+                np.bincount(series_groups, weights=dx * dy, minlength=n_groups) / counts,
+                np.bincount(series_groups, weights=dy * dy, minlength=n_groups) / counts
+            )
+    
+    return moments
+
+def _linregress_moments(counts, x_mean, y_mean, ssxm, ssxym, ssym):
+    """
+    Fit a least-squares line of y on x within every group from its moments.
+    
+    Matches scipy.stats.linregress (two-sided p-value) for each group.
+    
+    Args:
+        counts (ndarray): Observations per group
+        x_mean, y_mean (ndarray): Per-group means
+        ssxm, ssxym, ssym (ndarray): Per-group average squared deviations
+        
+    Returns:
+        dict: Per-group arrays 'slope', 'intercept', 'r_value' and 'p_value'
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if np.any((ssxm == 0) & (counts > 1)):
+            raise ValueError("Cannot calculate a linear regression if all x values are identical")
+        
+        r_value = np.where((ssxm == 0) | (ssym == 0), 0.0,
+                           np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0))
+        slope = ssxym / ssxm
+        intercept = y_mean - slope * x_mean
+        
+        # Two points always fit exactly
+        dof = counts - 2
+        t = r_value * np.sqrt(dof / ((1.0 - r_value + _TINY) * (1.0 + r_value + _TINY)))
+        p_value = np.where(counts == 2, np.where(ssym == 0, 1.0, 0.0),
+                           special.stdtr(dof, -np.abs(t)) * 2)
+    
+    return {'slope': slope, 'intercept': intercept, 'r_value': r_value, 'p_value': p_value}
+
+def _fit_trends(ad_daily_data, groups, n_groups, min_days):
+    """
+    Fit the CTR, conversion rate and CPC trends of every ad at once.
+    
+    The sums behind all the fits, and behind the frequency vs. CTR correlation,
+    are accumulated in a single pass over the rows.
+    
+    Args:
+        ad_daily_data (DataFrame): Date-sorted daily rows with a day_number column
+        groups (ndarray): Ad number (0 to n_groups - 1) of each row
+        n_groups (int): Number of ads
+        min_days (int): Minimum data points for the conversion rate and CPC fits
+        
+    Returns:
+        dict: Fits by trend ('ctr', 'conversion', 'cpc') for the available columns,
+            plus the per-ad 'frequency_ctr' correlation when it can be computed
+    """
+    columns = ad_daily_data.columns
+    day_number = ad_daily_data['day_number'].to_numpy(dtype=np.float64)
+    
+    # (name, x, y, rows used, minimum rows for a fit) of each series
+    series = []
+    
+    if 'ctr' in columns:
+        ctr = ad_daily_data['ctr'].to_numpy(dtype=np.float64)
+        series.append(('ctr', day_number, ctr, np.ones(len(ctr), dtype=bool), None))
+        
+        # Correlation over the days with both a frequency and a CTR
+        if 'frequency' in columns:
+            frequency = ad_daily_data['frequency'].to_numpy(dtype=np.float64)
+            series.append(('frequency_ctr', frequency, ctr, ~np.isnan(frequency) & ~np.isnan(ctr), None))
+    
+    # Conversion rate and CPC are fitted on the days where they are defined
+    if 'clicks' in columns:
+        clicks = ad_daily_data['clicks'].to_numpy(dtype=np.float64)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if 'conversions' in columns:
+                conv_rate = ad_daily_data['conversions'].to_numpy(dtype=np.float64) / clicks
+                conv_rate *= 100
+                series.append(('conversion', day_number, conv_rate, ~np.isnan(conv_rate), max(min_days, 1)))
+            
+            if 'spend' in columns:
+                cpc = ad_daily_data['spend'].to_numpy(dtype=np.float64) / clicks
+                series.append(('cpc', day_number, cpc, ~np.isnan(cpc), min_days))
+    
+    trends = {}
+    if not series:
+        return trends
+    
+    moments = _group_moments(groups, n_groups,
+                             np.column_stack([s[1] for s in series]),
+                             np.column_stack([s[2] for s in series]),
+                             np.column_stack([s[3] for s in series]))
+    
+    for (name, _, _, _, min_points), (counts, x_mean, y_mean, ssxm, ssxym, ssym) in zip(series, moments):
+        if name == 'frequency_ctr':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                trends[name] = np.clip(ssxym / np.sqrt(ssxm) / np.sqrt(ssym), -1.0, 1.0)
+            continue
+        
+        if min_points is None:
+            trends[name] = _linregress_moments(counts, x_mean, y_mean, ssxm, ssxym, ssym)
+            continue
+        
+        # Ads with too few data points are left unfitted
+        fitted = counts >= min_points
+        trends[name] = _linregress_moments(np.where(fitted, counts, 0),
+                                           *(np.where(fitted, values, np.nan)
+                                             for values in (x_mean, y_mean, ssxm, ssxym, ssym)))
+        trends[name]['fitted'] = fitted
+    
+    return trends
+
+def _empty_result():
+    """Fatigue result for an ad that was not found fatigued."""
+    return {
         'is_fatigued': False,
         'confidence': 0,
         'metrics': {},
         'recommendation': None
     }
+
+def _prepare_ad_data(ad_daily_data, min_days, presorted=False):
+    """
+    Sort one ad's daily data by date and number its days.
     
+    Args:
+        ad_daily_data (DataFrame): Daily ad performance data
+        min_days (int): Minimum number of days required for analysis
+        presorted (bool): Whether the dates are already datetimes in sorted order
+        
+    Returns:
+        tuple: (sorted data with a day_number column, days running), or None if
+            the ad has too little data to analyze
+    """
     # Check if we have enough data
     if ad_daily_data is None or len(ad_daily_data) < min_days:
-        return results
+        return None
     
-    # Ensure data is sorted by date
-    ad_daily_data = ad_daily_data.sort_values('date')
+    # Ensure data is sorted by date (rows on the same date keep their order)
+    if not presorted:
+        ad_daily_data = _sort_by_date(ad_daily_data)
     
     # Extract key metrics
-    dates = pd.to_datetime(ad_daily_data['date'])
+    dates = ad_daily_data['date']
     days_running = (dates.max() - dates.min()).days + 1
     
     # Skip if not enough days
     if days_running < min_days:
-        return results
+        return None
+    
+    ad_daily_data = ad_daily_data.assign(day_number=(dates - dates.min()).dt.days)
+    
+    return ad_daily_data, days_running
+
+def _sort_by_date(ad_daily_data):
+    """
+    Parse the dates of daily ad data and sort the rows by them.
+    
+    Args:
+        ad_daily_data (DataFrame): Daily ad performance data
+        
+    Returns:
+        DataFrame: Rows in date order, with datetime dates
+    """
+    ad_daily_data = ad_daily_data.assign(date=pd.to_datetime(ad_daily_data['date']))
+    return ad_daily_data.sort_values('date', kind='stable')
+
+def detect_ad_fatigue(ad_daily_data, min_days=5, confidence_threshold=0.90, presorted=False):
+    """
+    Enhanced ad fatigue detection using statistical analysis and regression.
+    
+    Args:
+        ad_daily_data (DataFrame): Daily ad performance data with columns:
+            - date: Date of the data point
+            - ad_id: Identifier for the ad
+            - ad_name: Name of the ad
+            - impressions: Number of impressions
+            - clicks: Number of clicks
+            - ctr: Click-through rate (percentage)
+            - frequency: Average impression frequency
+            - spend: Amount spent
+            - conversions: Number of conversions (if available)
+        min_days (int): Minimum number of days required for analysis
+        confidence_threshold (float): Statistical confidence threshold (0-1)
+        presorted (bool): Whether ad_daily_data's dates are already datetimes in
+            sorted order, so they need no parsing or sorting
+        
+    Returns:
+        dict: Fatigue analysis results with metrics and confidence scores
+    """
+    prepared = _prepare_ad_data(ad_daily_data, min_days, presorted)
+    if prepared is None:
+        return _empty_result()
+    
+    ad_daily_data, days_running = prepared
     
     # Get basic ad info
     ad_id = ad_daily_data['ad_id'].iloc[0]
     ad_name = ad_daily_data['ad_name'].iloc[0] if 'ad_name' in ad_daily_data.columns else f"Ad {ad_id}"
     
-    # Calculate cumulative metrics
-    ad_daily_data['day_number'] = (dates - dates.min()).dt.days
+    # Fit the trend regressions (a single group)
+    trends = _fit_trends(ad_daily_data, np.zeros(len(ad_daily_data), dtype=np.intp), 1, min_days)
+    
+    ctr = ad_daily_data['ctr'].to_numpy(dtype=np.float64) if 'ctr' in ad_daily_data.columns else None
+    
+    return _assess_fatigue(ctr, ad_name, days_running, trends, 0, min_days, confidence_threshold)
+
+def _assess_fatigue(ctr, ad_name, days_running, trends, position, min_days, confidence_threshold):
+    """
+    Combine an ad's fitted trends and other signals into a fatigue result.
+    
+    Args:
+        ctr (ndarray): The ad's daily CTRs in date order (float64), or None
+            without a ctr column
+        ad_name (str): Name of the ad, for the recommendation
+        days_running (int): Days between the ad's first and last data point, inclusive
+        trends (dict): Fits from _fit_trends
+        position (int): The ad's group number in trends
+        min_days (int): Minimum number of days required for analysis
+        confidence_threshold (float): Statistical confidence threshold (0-1)
+        
+    Returns:
+        dict: Fatigue analysis results with metrics and confidence scores
+    """
+    results = _empty_result()
     
     # Create analysis metrics
     metrics = {}
     
     # 1. Linear regression on CTR over time
-    if 'ctr' in ad_daily_data.columns:
-        # Calculate linear regression
-        slope, intercept, r_value, p_value, std_err = stats.linregress(
-            ad_daily_data['day_number'], 
-            ad_daily_data['ctr']
-        )
+    if 'ctr' in trends:
+        fit = trends['ctr']
+        slope = fit['slope'][position]
+        intercept = fit['intercept'][position]
+        r_value = fit['r_value'][position]
+        p_value = fit['p_value'][position]
         
         # Store regression metrics
         metrics['ctr_regression'] = {
@@ -81,110 +381,80 @@ def detect_ad_fatigue(ad_daily_data, min_days=5, confidence_threshold=0.90):
             metrics['ctr_regression']['pct_change'] = pct_change
         
     # 2. Frequency vs. CTR correlation
-    if 'frequency' in ad_daily_data.columns and 'ctr' in ad_daily_data.columns:
-        # Calculate correlation
-        corr = ad_daily_data['frequency'].corr(ad_daily_data['ctr'])
+    if 'frequency_ctr' in trends:
+        corr = trends['frequency_ctr'][position]
         metrics['frequency_ctr_correlation'] = corr
         
         # Negative correlation often indicates fatigue
         metrics['negative_frequency_correlation'] = corr < -0.3
     
-    # 3. Conversion rate decay over time
-    if 'conversions' in ad_daily_data.columns and 'clicks' in ad_daily_data.columns:
-        # Calculate daily conversion rates
-        ad_daily_data['conv_rate'] = (ad_daily_data['conversions'] / ad_daily_data['clicks']) * 100
+    # 3. Conversion rate decay over time (fitted on days with a conversion rate)
+    if 'conversion' in trends and trends['conversion']['fitted'][position]:
+        fit = trends['conversion']
+        slope = fit['slope'][position]
+        p_value = fit['p_value'][position]
         
-        # Regression on conversion rate
-        if not ad_daily_data['conv_rate'].isna().all():
-            # Remove NaN values
-            conv_data = ad_daily_data.dropna(subset=['conv_rate'])
-            
-            if len(conv_data) >= min_days:
-                slope, intercept, r_value, p_value, std_err = stats.linregress(
-                    conv_data['day_number'], 
-                    conv_data['conv_rate']
-                )
-                
-                metrics['conversion_regression'] = {
-                    'slope': slope,
-                    'p_value': p_value,
-                    'significant_decline': p_value < 0.1 and slope < 0
-                }
-    
-    # 4. CPC increase over time
-    if 'clicks' in ad_daily_data.columns and 'spend' in ad_daily_data.columns:
-        # Calculate CPC
-        ad_daily_data['cpc'] = ad_daily_data['spend'] / ad_daily_data['clicks']
-        
-        # Regression on CPC
-        cpc_data = ad_daily_data.dropna(subset=['cpc'])
-        if len(cpc_data) >= min_days:
-            slope, intercept, r_value, p_value, std_err = stats.linregress(
-                cpc_data['day_number'], 
-                cpc_data['cpc']
-            )
-            
-            metrics['cpc_regression'] = {
-                'slope': slope,
-                'p_value': p_value,
-                'significant_increase': p_value < 0.1 and slope > 0
-            }
+        metrics['conversion_regression'] = {
+            'slope': slope,
+            'p_value': p_value,
+            'significant_decline': p_value < 0.1 and slope < 0
+        }
+    
+    # 4. CPC increase over time (fitted on days with a CPC)
+    if 'cpc' in trends and trends['cpc']['fitted'][position]:
+        fit = trends['cpc']
+        slope = fit['slope'][position]
+        p_value = fit['p_value'][position]
+        
+        metrics['cpc_regression'] = {
+            'slope': slope,
+            'p_value': p_value,
+            'significant_increase': p_value < 0.1 and slope > 0
+        }
     
     # 5. Calculate Moving Averages and Acceleration
-    if 'ctr' in ad_daily_data.columns and len(ad_daily_data) >= min_days + 2:
-        # Calculate 3-day moving average
-        ad_daily_data['ctr_ma3'] = ad_daily_data['ctr'].rolling(window=3, min_periods=1).mean()
+    if ctr is not None and len(ctr) >= min_days + 2:
+        # Calculate the last four 3-day moving averages (over the days with a
+        # CTR); only the last three changes between them are used
+        padded = np.concatenate(([np.nan, np.nan], ctr[-6:]))[-6:]
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 3)
+        with np.errstate(invalid='ignore'):
+            ctr_ma3 = np.nansum(windows, axis=1) / (~np.isnan(windows)).sum(axis=1)
+        
+        # A window of equal values averages to exactly that value (no rounding drift)
+        window_max = np.fmax.reduce(windows, axis=1)
+        ctr_ma3 = np.where(window_max == np.fmin.reduce(windows, axis=1), window_max, ctr_ma3)
         
         # Calculate rate of change in the moving average (acceleration)
-        ad_daily_data['ctr_ma3_change'] = ad_daily_data['ctr_ma3'].diff()
+        ctr_ma3_change = np.diff(ctr_ma3)
         
         # Check if recent changes are negative
-        recent_changes = ad_daily_data['ctr_ma3_change'].tail(3).mean()
+        recent = ctr_ma3_change[~np.isnan(ctr_ma3_change)]
+        recent_changes = recent.mean() if len(recent) else np.nan
         metrics['recent_ctr_velocity'] = recent_changes
         metrics['accelerating_decline'] = recent_changes < 0
     
     # Store all metrics
     results['metrics'] = metrics
     
-    # Determine if ad is fatigued based on multiple signals
-    fatigue_signals = 0
-    max_signals = 0
-    
-    # CTR decline signal
-    if 'ctr_regression' in metrics:
-        max_signals += 1
-        if metrics['ctr_regression'].get('significant_decline', False):
-            fatigue_signals += 1
-    
-    # Negative frequency correlation signal
-    if 'negative_frequency_correlation' in metrics:
-        max_signals += 1
-        if metrics['negative_frequency_correlation']:
-            fatigue_signals += 1
-    
-    # Conversion rate decline signal
-    if 'conversion_regression' in metrics:
-        max_signals += 1
-        if metrics['conversion_regression'].get('significant_decline', False):
-            fatigue_signals += 1
-    
-    # CPC increase signal
-    if 'cpc_regression' in metrics:
-        max_signals += 1
-        if metrics['cpc_regression'].get('significant_increase', False):
-            fatigue_signals += 1
-    
-    # Accelerating decline signal
-    if 'accelerating_decline' in metrics:
-        max_signals += 1
-        if metrics['accelerating_decline']:
-            fatigue_signals += 1
+    # Determine if ad is fatigued based on multiple signals: one bit per signal
+    # that could be checked, and one per signal that fired
+    signals_checked = 0
+    signals_fired = 0
+    for bit, (metric, flag) in enumerate(_FATIGUE_SIGNALS):
+        if metric in metrics:
+            signals_checked |= 1 << bit
+            fired = metrics[metric] if flag is None else metrics[metric].get(flag, False)
+            signals_fired |= bool(fired) << bit
+    
+    fatigue_signals = signals_fired.bit_count()
+    max_signals = signals_checked.bit_count()
     
     # Calculate confidence based on signals
     signal_confidence = fatigue_signals / max_signals if max_signals > 0 else 0
     
     # Adjust for the number of days (more days = more confident)
-    day_factor = min(1.0, days_running / 14)  # Max factor at 14 days
+    day_factor = _DAY_FACTORS[min(days_running, _FULL_CONFIDENCE_DAYS)]
     
     # Overall confidence calculation
     confidence = signal_confidence * day_factor
@@ -234,38 +504,103 @@ def batch_fatigue_analysis(ads_df, min_impressions=1000):
     if ads_df.empty:
         return []
     
-    # Group by ad_id to get total impressions
-    ad_totals = ads_df.groupby('ad_id').agg({
+    # Encode ad_id as integer codes once (in sorted id order, -1 for a missing
+    # id); grouping and filtering then work on the codes
+    codes, ad_ids = pd.factorize(ads_df['ad_id'], sort=True)
+    
+    # Group by ad to get total impressions
+    ad_totals = ads_df.groupby(codes).agg({
         'impressions': 'sum',
         'ad_name': 'first'
-    }).reset_index()
+    })
     
     # Filter for ads with minimum impressions
-    qualified_ads = ad_totals[ad_totals['impressions'] >= min_impressions]['ad_id'].tolist()
+    qualified = np.zeros(len(ad_ids), dtype=bool)
+    qualified[ad_totals.index[(ad_totals.index >= 0) & (ad_totals['impressions'] >= min_impressions)]] = True
     
     fatigued_ads = []
-    
-    # Analyze each qualified ad
-    for ad_id in qualified_ads:
-        ad_data = ads_df[ads_df['ad_id'] == ad_id].copy()
+    if not qualified.any():
+        return fatigued_ads
+    
+    # Renumber the qualified ads 0, 1, ...
+    rows = (codes >= 0) & qualified[codes]
+    ad_ids = ad_ids[qualified]
+    codes = (np.cumsum(qualified) - 1)[codes[rows]]
+    
+    # Parse and sort the qualified ads' dates once (carrying each row's code as
+    # its index), then lay the ads out as contiguous runs of rows (ad by ad,
+    # each in date order) for the trend kernel
+    ad_rows = _sort_by_date(ads_df[rows].set_axis(codes))
+    codes = ad_rows.index.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    ad_rows = ad_rows.iloc[order]
+    codes = codes[order]
+    
+    # Prepare every ad as detect_ad_fatigue would (default settings), all at once
+    min_days = 5
+    confidence_threshold = 0.90
+    dates = ad_rows['date']
+    date_range = dates.groupby(codes).agg(['min', 'max'])
+    first_dates = date_range['min'].array
+    span_days = (date_range['max'] - date_range['min']).dt.days.to_numpy()
+    counts = np.bincount(codes, minlength=len(ad_ids))
+    
+    # Ads without enough rows or days can't be analyzed, and ads running too
+    # briefly can't reach the confidence threshold whatever their signals
+    days_running = span_days + 1
+    eligible = ((counts >= min_days) & (days_running >= min_days)
+                & (np.minimum(1.0, days_running / _FULL_CONFIDENCE_DAYS) >= confidence_threshold))
+    if not eligible.any():
+        return fatigued_ads
+    
+    rows = eligible[codes]
+    day_number = (dates - first_dates.take(codes)).dt.days
+    ad_rows = ad_rows[rows].assign(day_number=day_number[rows])
+    
+    # Fit the trend regressions of all ads in one pass
+    n_ads = int(eligible.sum())
+    groups = (np.cumsum(eligible) - 1)[codes[rows]]
+    trends = _fit_trends(ad_rows, groups, n_ads, min_days)
+    
+    offsets = np.concatenate(([0], np.cumsum(counts[eligible])))
+    days_running = days_running[eligible].astype(int)
+    
+    # Each ad's CTRs are a view into one array, with no per-ad frames
+    ctr = ad_rows['ctr'].to_numpy(dtype=np.float64) if 'ctr' in ad_rows.columns else None
+    
+    # Each ad's name, as on its first day
+    ad_names = ad_rows['ad_name'].to_numpy()[offsets[:-1]]
+    
+    # Analyze each ad, recording the confidence and results of fatigued ads
+    confidences = np.zeros(n_ads)
+    fatigue_results = {}
+    for position in range(n_ads):
+        ad_ctr = ctr[offsets[position]:offsets[position + 1]] if ctr is not None else None
         
         # Run fatigue detection
-        fatigue_result = detect_ad_fatigue(ad_data)
+        fatigue_result = _assess_fatigue(ad_ctr, ad_names[position], int(days_running[position]),
+                                         trends, position, min_days, confidence_threshold)
         
-        # If fatigued, add to results
         if fatigue_result['is_fatigued']:
-            result = {
-                'ad_id': ad_id,
-                'ad_name': ad_data['ad_name'].iloc[0] if 'ad_name' in ad_data.columns else f"Ad {ad_id}",
-                'days_running': fatigue_result['days_running'],
-                'confidence': fatigue_result['confidence'],
-                'metrics': fatigue_result['metrics'],
-                'recommendation': fatigue_result['recommendation'],
-                'severity': fatigue_result.get('severity', 'medium')
-            }
-            fatigued_ads.append(result)
-    
-    # Sort by confidence (highest first)
-    fatigued_ads.sort(key=lambda x: x['confidence'], reverse=True)
-    
-    return fatigued_ads
\ No newline at end of file
+            confidences[position] = fatigue_result['confidence']
+            fatigue_results[position] = fatigue_result
+    
+    # Sort the fatigued ads by confidence (highest first, ties in ad order)
+    fatigued = np.fromiter(fatigue_results, dtype=np.intp, count=len(fatigue_results))
+    fatigued = fatigued[np.argsort(-confidences[fatigued], kind='stable')]
+    
+    # Build the results of the fatigued ads only
+    ad_ids = ad_ids[eligible].tolist()
+    for position in fatigued.tolist():
+        fatigue_result = fatigue_results[position]
+        fatigued_ads.append({
+            'ad_id': ad_ids[position],
+            'ad_name': ad_names[position],
+            'days_running': fatigue_result['days_running'],
+            'confidence': fatigue_result['confidence'],
+            'metrics': fatigue_result['metrics'],
+            'recommendation': fatigue_result['recommendation'],
+            'severity': fatigue_result.get('severity', 'medium')
+        })
+    
+    return fatigued_ads
@@ -1,4 +1,13 @@
+import functools
+
 import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; half-split means fall back to NumPy
+    NUMBA_AVAILABLE = False
 
 def generate_insights(processed_data, metrics, platform):
     """
@@ -18,29 +27,23 @@ def generate_insights(processed_data, metrics, platform):
         'strengths': []
     }
     
-    # Generate budget efficiency insights
-    budget_insights = analyze_budget_efficiency(processed_data, metrics, platform)
-    if budget_insights:
-        insights['budget_efficiency'] = budget_insights
-        insights['recommendations'].extend(budget_insights.get('recommendations', []))
-    
-    # Generate audience insights
-    audience_insights = analyze_audience_targeting(processed_data, metrics, platform)
-    if audience_insights:
-        insights['audience_targeting'] = audience_insights
-        insights['recommendations'].extend(audience_insights.get('recommendations', []))
-    
-    # Generate ad fatigue insights
-    fatigue_insights = analyze_ad_fatigue(processed_data, metrics, platform)
-    if fatigue_insights:
-        insights['ad_fatigue'] = fatigue_insights
-        insights['recommendations'].extend(fatigue_insights.get('recommendations', []))
-    
-    # Generate creative performance insights
-    creative_insights = analyze_creative_performance(processed_data, metrics, platform)
-    if creative_insights:
-        insights['creative_performance'] = creative_insights
-        insights['recommendations'].extend(creative_insights.get('recommendations', []))
+    # Use the master dataset if available (looked up once for all analyzers)
+    df = processed_data.get('master', processed_data.get('insights', None))
+    if df is not None and df.empty:
+        df = None
+    
+    # Generate budget efficiency, audience, ad fatigue and creative performance insights
+    analyses = [
+        ('budget_efficiency', analyze_budget_efficiency, df),
+        ('audience_targeting', analyze_audience_targeting, processed_data),
+        ('ad_fatigue', analyze_ad_fatigue, df),
+        ('creative_performance', analyze_creative_performance, df)
+    ]
+    for section, analyze, data in analyses:
+        section_insights = analyze(data, metrics, platform)
+        if section_insights:
+            insights[section] = section_insights
+            insights['recommendations'].extend(section_insights.get('recommendations', []))
     
     # Analyze trends
     if 'trends' in metrics:
@@ -49,91 +52,146 @@ def generate_insights(processed_data, metrics, platform):
             insights['trends'] = trend_insights
             insights['recommendations'].extend(trend_insights.get('recommendations', []))
     
-    # Estimate potential savings
-    potential_savings = estimate_potential_savings(insights)
+    # Estimate potential savings and improvement from one pass over the recommendations
+    potential_savings, high_severity_count, medium_severity_count = _summarize_recommendations(insights['recommendations'])
     insights['potential_savings'] = potential_savings
-    
-    # Estimate potential improvement
-    potential_improvement = estimate_potential_improvement(insights, metrics)
-    insights['potential_improvement'] = potential_improvement
+    insights['potential_improvement'] = _improvement_estimate(high_severity_count, medium_severity_count)
     
     return insights
 
-def analyze_budget_efficiency(processed_data, metrics, platform):
+def _iter_records(df, columns):
+    """
+    Iterate over selected fields of each row without building a Series per row.
+    
+    The whole frame is converted at once, as DataFrame.iterrows does, so the
+    values have the same types iterrows would give them.
+    
+    Args:
+        df (DataFrame): Rows to iterate over
+        columns (list): Names of the columns to yield, in order
+        
+    Returns:
+        iterator: A tuple of the selected values for each row
+    """
+    values = df.to_numpy()
+    return zip(*(values[:, df.columns.get_loc(column)] for column in columns))
+
+def _finite_ratio(numerator, denominator, scale=1):
+    """
+    Element-wise ratio of two columns, with infinite ratios (division by zero) as NaN.
+    
+    Args:
+        numerator (Series): Numerator values
+        denominator (Series): Denominator values
+        scale (float): Factor to multiply the ratios by
+        
+    Returns:
+        ndarray: The float64 ratios
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = numerator.to_numpy(dtype=np.float64) / denominator.to_numpy(dtype=np.float64)
+    ratio *= scale
+    ratio[np.isinf(ratio)] = np.nan
+    return ratio
+
+def analyze_budget_efficiency(df, metrics, platform):
     """Analyze budget efficiency and identify savings opportunities"""
     insights = {
         'recommendations': []
     }
     
-    # Use the master dataset if available
-    df = processed_data.get('master', processed_data.get('insights', None))
-    if df is None or df.empty:
+    # Without a dataset there is nothing to analyze
+    if df is None:
         return insights
     
-    # Identify high-CPA campaigns
-    if 'campaign_name' in df.columns and 'campaign_id' in df.columns:
-        campaign_metrics = df.groupby(['campaign_id', 'campaign_name']).agg({
-            'spend': 'sum',
-            'clicks': 'sum',
-            'impressions': 'sum',
-            'purchases': 'sum' if 'purchases' in df.columns else 'count'
-        }).reset_index()
+    columns = frozenset(df.columns)
+    
+    # Aggregate campaign metrics once for both checks below
+    if {'campaign_id', 'campaign_name'} <= columns:
+        campaign_metrics = df.groupby(['campaign_id', 'campaign_name'], observed=True).agg(
+            spend=('spend', 'sum'),
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            purchases=('purchases', 'sum' if 'purchases' in columns else 'count')
+        ).reset_index()
         
         # Calculate CPA for each campaign
-        campaign_metrics['cpa'] = campaign_metrics['spend'] / campaign_metrics['purchases']
-        campaign_metrics = campaign_metrics.replace([np.inf, -np.inf], np.nan)
+        cpa = _finite_ratio(campaign_metrics['spend'], campaign_metrics['purchases'])
+        campaign_metrics['cpa'] = cpa
+        
+        # Get average CPA and impressions (skipping missing values, like Series.mean)
+        spend = campaign_metrics['spend'].to_numpy(dtype=np.float64)
+        impressions = campaign_metrics['impressions'].to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_cpa = np.nansum(cpa) / np.count_nonzero(~np.isnan(cpa))
+            avg_impressions = np.nansum(impressions) / np.count_nonzero(~np.isnan(impressions))
         
-        # Get average CPA
-        avg_cpa = campaign_metrics['cpa'].mean()
+        # Find campaigns with high CPA (>50% above average), and campaigns with
+        # budget but low impressions
+        high_cpa_mask = cpa > avg_cpa * 1.5
+        low_impression_mask = (spend > 0) & (impressions < avg_impressions * 0.5)
         
-        # Find campaigns with high CPA (>50% above average)
-        high_cpa_campaigns = campaign_metrics[campaign_metrics['cpa'] > avg_cpa * 1.5]
-        high_cpa_campaigns = high_cpa_campaigns.dropna(subset=['cpa']).sort_values('cpa', ascending=False)
+        high_cpa_campaigns = campaign_metrics.iloc[np.flatnonzero(high_cpa_mask)].sort_values('cpa', ascending=False)
+        low_impression_campaigns = campaign_metrics.iloc[np.flatnonzero(low_impression_mask)]
         
         insights['inefficient_campaigns'] = high_cpa_campaigns.to_dict('records')
         
         # Generate recommendations for high CPA campaigns
-        for _, campaign in high_cpa_campaigns.iterrows():
+        high_cpa_rows = _iter_records(high_cpa_campaigns, ['campaign_id', 'campaign_name', 'cpa', 'spend'])
+        avg_cpa_text = f"{avg_cpa:.2f}"  # The same in every recommendation
+        for campaign_id, campaign_name, campaign_cpa, campaign_spend in high_cpa_rows:
             insights['recommendations'].append({
                 'type': 'high_cpa',
                 'platform': platform,
-                'campaign_id': campaign['campaign_id'],
-                'campaign_name': campaign['campaign_name'],
-                'current_cpa': campaign['cpa'],
+                'campaign_id': campaign_id,
+                'campaign_name': campaign_name,
+                'current_cpa': campaign_cpa,
                 'avg_cpa': avg_cpa,
-                'severity': 'high' if campaign['cpa'] > avg_cpa * 2 else 'medium',
-                'potential_savings': campaign['spend'] * 0.3,  # Estimate 30% savings
-                'recommendation': f"Consider reducing budget or revising creative for campaign '{campaign['campaign_name']}' as its CPA (${campaign['cpa']:.2f}) is significantly higher than average (${avg_cpa:.2f})."
+                'severity': 'high' if campaign_cpa > avg_cpa * 2 else 'medium',
+                'potential_savings': campaign_spend * 0.3,  # Estimate 30% savings
+                'recommendation': f"Consider reducing budget or revising creative for campaign '{campaign_name}' as its CPA (${campaign_cpa:.2f}) is significantly higher than average (${avg_cpa_text})."
             })
-    
-    # Identify campaigns with budget but low impressions
-    if 'campaign_name' in df.columns and 'campaign_id' in df.columns:
-        avg_impressions = campaign_metrics['impressions'].mean()
-        
-        low_impression_campaigns = campaign_metrics[
-            (campaign_metrics['spend'] > 0) & 
-            (campaign_metrics['impressions'] < avg_impressions * 0.5)
-        ]
         
         insights['low_reach_campaigns'] = low_impression_campaigns.to_dict('records')
         
         # Generate recommendations for low impression campaigns
-        for _, campaign in low_impression_campaigns.iterrows():
+        low_impression_rows = _iter_records(low_impression_campaigns,
+                                            ['campaign_id', 'campaign_name', 'spend', 'impressions'])
+        for campaign_id, campaign_name, campaign_spend, campaign_impressions in low_impression_rows:
             insights['recommendations'].append({
                 'type': 'low_reach',
                 'platform': platform,
-                'campaign_id': campaign['campaign_id'],
-                'campaign_name': campaign['campaign_name'],
-                'spend': campaign['spend'],
-                'impressions': campaign['impressions'],
+                'campaign_id': campaign_id,
+                'campaign_name': campaign_name,
+                'spend': campaign_spend,
+                'impressions': campaign_impressions,
                 'avg_impressions': avg_impressions,
                 'severity': 'medium',
-                'potential_savings': campaign['spend'] * 0.2,  # Estimate 20% savings
-                'recommendation': f"Campaign '{campaign['campaign_name']}' has spent ${campaign['spend']:.2f} but received only {campaign['impressions']} impressions (50% below average). Consider reviewing targeting or creative quality."
+                'potential_savings': campaign_spend * 0.2,  # Estimate 20% savings
+                'recommendation': f"Campaign '{campaign_name}' has spent ${campaign_spend:.2f} but received only {campaign_impressions} impressions (50% below average). Consider reviewing targeting or creative quality."
             })
     
     return insights
 
+def _best_and_worst(segment_metrics):
+    """
+    Find the segments with the highest and lowest conversion rate.
+    
+    Args:
+        segment_metrics (list): Segment metric dictionaries
+        
+    Returns:
+        tuple: (best, worst) segment, the first one on ties, or None if no
+            segment has a conversion rate
+    """
+    rates = np.array([m.get('conversion_rate', np.nan) for m in segment_metrics])
+    valid = np.flatnonzero(~np.isnan(rates))
+    if len(valid) == 0:
+        return None
+    
+    valid_rates = rates[valid]
+    return segment_metrics[valid[np.argmax(valid_rates)]], segment_metrics[valid[np.argmin(valid_rates)]]
+
 def analyze_audience_targeting(processed_data, metrics, platform):
     """Analyze audience targeting effectiveness"""
     insights = {
@@ -152,11 +210,10 @@ def analyze_audience_targeting(processed_data, metrics, platform):
         
         # Find best and worst performing age groups by conversion rate
         if len(age_metrics) > 1:
-            age_metrics_valid = [m for m in age_metrics if not np.isnan(m.get('conversion_rate', np.nan))]
+            best_and_worst = _best_and_worst(age_metrics)
             
-            if age_metrics_valid:
-                best_age = max(age_metrics_valid, key=lambda x: x['conversion_rate'])
-                worst_age = min(age_metrics_valid, key=lambda x: x['conversion_rate'])
+            if best_and_worst:
+                best_age, worst_age = best_and_worst
                 
                 # Check if there's a significant difference (>50%)
                 if worst_age['conversion_rate'] * 1.5 < best_age['conversion_rate']:
@@ -178,11 +235,10 @@ def analyze_audience_targeting(processed_data, metrics, platform):
         
         # Find best and worst performing genders by conversion rate
         if len(gender_metrics) > 1:
-            gender_metrics_valid = [m for m in gender_metrics if not np.isnan(m.get('conversion_rate', np.nan))]
+            best_and_worst = _best_and_worst(gender_metrics)
             
-            if gender_metrics_valid:
-                best_gender = max(gender_metrics_valid, key=lambda x: x['conversion_rate'])
-                worst_gender = min(gender_metrics_valid, key=lambda x: x['conversion_rate'])
+            if best_and_worst:
+                best_gender, worst_gender = best_and_worst
                 
                 # Check if there's a significant difference (>50%)
                 if worst_gender['conversion_rate'] * 1.5 < best_gender['conversion_rate']:
@@ -204,11 +260,10 @@ def analyze_audience_targeting(processed_data, metrics, platform):
         
         # Find best and worst performing devices by conversion rate
         if len(device_metrics) > 1:
-            device_metrics_valid = [m for m in device_metrics if not np.isnan(m.get('conversion_rate', np.nan))]
+            best_and_worst = _best_and_worst(device_metrics)
             
-            if device_metrics_valid:
-                best_device = max(device_metrics_valid, key=lambda x: x['conversion_rate'])
-                worst_device = min(device_metrics_valid, key=lambda x: x['conversion_rate'])
+            if best_and_worst:
+                best_device, worst_device = best_and_worst
                 
                 # Check if there's a significant difference (>50%)
                 if worst_device['conversion_rate'] * 1.5 < best_device['conversion_rate']:
@@ -226,7 +281,84 @@ def analyze_audience_targeting(processed_data, metrics, platform):
     
     return insights
 
-def analyze_ad_fatigue(processed_data, metrics, platform):
+def _half_mean_rows(offsets, values):
+    """
+    Means over the first and second half of each group's rows kernel, skipping NaN.
+    
+    Args:
+        offsets (ndarray): Start row of each group, followed by the total row count
+        values (ndarray): Values to average, one column per metric
+        
+    Returns:
+        ndarray: One row per group: the first-half means of the metrics, then
+            their second-half means
+    """
+    n_groups = len(offsets) - 1
+    n_metrics = values.shape[1]
+    means = np.empty((n_groups, 2 * n_metrics))
+    
+    for g in range(n_groups):
+        start = offsets[g]
+        middle = start + (offsets[g + 1] - start) // 2
+        bounds = (start, middle, offsets[g + 1])
+        
+        for half in range(2):
+            for m in range(n_metrics):
+                total = 0.0
+                count = 0
+                for i in range(bounds[half], bounds[half + 1]):
+                    if not np.isnan(values[i, m]):
+                        total += values[i, m]
+                        count += 1
+                means[g, half * n_metrics + m] = total / count if count > 0 else np.nan
+    
+    return means
+
+# Not parallel, so the kernel is safe to call from any thread: numba's default
+# workqueue threading layer aborts the process when two threads enter parallel
+# kernels at once. Each ad only has a few dozen rows to average anyway
+_half_mean_kernel = njit(cache=True)(_half_mean_rows) if NUMBA_AVAILABLE else None
+
+def _half_means(codes, n_groups, values):
+    """
+    Means over the first and second half of each group's rows, skipping NaN.
+    
+    Args:
+        codes (ndarray): Group number (0 to n_groups - 1) of each row, in
+            contiguous ascending runs
+        n_groups (int): Number of groups
+        values (ndarray): Values to average, one float64 column per metric
+        
+    Returns:
+        ndarray: One row per group: the first-half means of the metrics, then
+            their second-half means
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    
+    if _half_mean_kernel is not None:
+        return _half_mean_kernel(offsets, values)
+    
+    # Number each group's halves 2 * group and 2 * group + 1
+    position = np.arange(len(codes)) - offsets[codes]
+    halves = 2 * codes + (position >= (counts // 2)[codes])
+    
+    n_metrics = values.shape[1]
+    means = np.empty((n_groups, 2 * n_metrics))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for m in range(n_metrics):
+            column = values[:, m]
+            present = ~np.isnan(column)
+            totals = np.bincount(halves[present], weights=column[present], minlength=2 * n_groups)
+            half_counts = np.bincount(halves[present], minlength=2 * n_groups)
+            half_means = (totals / half_counts).reshape(n_groups, 2)
+            means[:, m] = half_means[:, 0]
+            means[:, n_metrics + m] = half_means[:, 1]
+    
+    return means
+
+def analyze_ad_fatigue(df, metrics, platform):
     """Analyze ad performance over time to identify fatigue"""
     insights = {
         'recommendations': []
@@ -241,13 +373,14 @@ def analyze_ad_fatigue(processed_data, metrics, platform):
     if not daily_metrics:
         return insights
     
-    # Use the master dataset if available
-    df = processed_data.get('master', processed_data.get('insights', None))
-    if df is None or df.empty:
+    # Without a dataset there is nothing to analyze
+    if df is None:
         return insights
     
+    columns = frozenset(df.columns)
+    
     # Check if we have ad-level data
-    if 'ad_id' in df.columns and 'ad_name' in df.columns and 'date' in df.columns:
+    if {'ad_id', 'ad_name', 'date'} <= columns:
         # Group by ad and date
         ad_daily = df.groupby(['ad_id', 'ad_name', 'date']).agg({
             'impressions': 'sum',
@@ -255,107 +388,133 @@ def analyze_ad_fatigue(processed_data, metrics, platform):
             'frequency': 'mean'
         }).reset_index()
         
-        # Calculate CTR
-        ad_daily['ctr'] = (ad_daily['clicks'] / ad_daily['impressions']) * 100
-        
         # Sort by date
         ad_daily = ad_daily.sort_values(['ad_id', 'date'])
         
-        # Identify ads running for more than 5 days
-        ad_counts = ad_daily.groupby('ad_id').size()
-        long_running_ads = ad_counts[ad_counts > 5].index
+        # Number the ads (in ad_id order) and lay each ad's days out contiguously
+        codes, ad_ids = pd.factorize(ad_daily['ad_id'], sort=True)
+        order = np.argsort(codes, kind='stable')
+        ad_daily = ad_daily.iloc[order]
+        codes = codes[order]
+        ad_counts = np.bincount(codes, minlength=len(ad_ids))
         
-        # Analyze fatigue signals for long-running ads
+        # Calculate CTR on the raw arrays (NaN or inf for days without impressions)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ctr = ad_daily['clicks'].to_numpy(dtype=np.float64) / ad_daily['impressions'].to_numpy(dtype=np.float64)
+        ctr *= 100
+        
+        # Average CTR and frequency over the first and second half of every ad's days
+        frequency = ad_daily['frequency'].to_numpy(dtype=np.float64)
+        half_means = _half_means(codes, len(ad_ids), np.column_stack((ctr, frequency)))
+        first_rows = np.concatenate(([0], np.cumsum(ad_counts)[:-1]))
+        ad_names = ad_daily['ad_name'].to_numpy()
+        ad_ids = ad_ids.tolist()
+        
+        # Check every ad for fatigue signals at once: declining CTR and increasing
+        # frequency in a long-running ad (need at least 6 days for comparison)
+        first_half_ctrs, first_half_frequencies, second_half_ctrs, second_half_frequencies = half_means.T
+        fatigued = ((ad_counts > 5) & (second_half_ctrs < first_half_ctrs * 0.8)
+                    & (second_half_frequencies > first_half_frequencies * 1.2))
+        severe = second_half_ctrs < first_half_ctrs * 0.6
+        
+        # Analyze fatigue signals for the flagged ads
         fatigued_ads = []
         
-        for ad_id in long_running_ads:
-            ad_data = ad_daily[ad_daily['ad_id'] == ad_id]
+        for code in np.flatnonzero(fatigued):
+            ad_id = ad_ids[code]
+            first_half_ctr, first_half_frequency, second_half_ctr, second_half_frequency = half_means[code]
             
-            if len(ad_data) >= 6:  # Need at least 6 days for comparison
-                # Get first half and second half data
-                half_point = len(ad_data) // 2
-                first_half = ad_data.iloc[:half_point]
-                second_half = ad_data.iloc[half_point:]
-                
-                # Calculate averages
-                first_half_ctr = first_half['ctr'].mean()
-                second_half_ctr = second_half['ctr'].mean()
-                
-                first_half_frequency = first_half['frequency'].mean()
-                second_half_frequency = second_half['frequency'].mean()
-                
-                # Check for fatigue signals: declining CTR and increasing frequency
-                if second_half_ctr < first_half_ctr * 0.8 and second_half_frequency > first_half_frequency * 1.2:
-                    ad_name = ad_data['ad_name'].iloc[0]
-                    days_running = len(ad_data)
-                    ctr_decline = ((second_half_ctr - first_half_ctr) / first_half_ctr) * 100
-                    frequency_increase = ((second_half_frequency - first_half_frequency) / first_half_frequency) * 100
-                    
-                    fatigued_ad = {
-                        'ad_id': ad_id,
-                        'ad_name': ad_name,
-                        'days_running': days_running,
-                        'ctr_decline': ctr_decline,
-                        'frequency_increase': frequency_increase,
-                        'first_half_ctr': first_half_ctr,
-                        'second_half_ctr': second_half_ctr,
-                        'first_half_frequency': first_half_frequency,
-                        'second_half_frequency': second_half_frequency,
-                        'severity': 'high' if second_half_ctr < first_half_ctr * 0.6 else 'medium'
-                    }
-                    
-                    fatigued_ads.append(fatigued_ad)
-                    
-                    # Add recommendation
-                    severity_word = 'severe' if fatigued_ad['severity'] == 'high' else 'moderate'
-                    insights['recommendations'].append({
-                        'type': 'ad_fatigue',
-                        'platform': platform,
-                        'ad_id': ad_id,
-                        'ad_name': ad_name,
-                        'days_running': days_running,
-                        'ctr_decline': abs(ctr_decline),
-                        'frequency_increase': frequency_increase,
-                        'severity': fatigued_ad['severity'],
-                        'potential_savings': 0,  # Ad fatigue is about performance improvement, not direct savings
-                        'recommendation': f"{severity_word.capitalize()} fatigue detected in ad '{ad_name}' after {days_running} days with CTR declining by {abs(ctr_decline):.1f}% while frequency increased by {frequency_increase:.1f}%. {'Pause and replace with fresh creative.' if fatigued_ad['severity'] == 'high' else 'Consider refreshing creative or adjusting targeting.'}"
-                    })
-        
+            ad_name = ad_names[first_rows[code]]
+            days_running = int(ad_counts[code])
+            ctr_decline = ((second_half_ctr - first_half_ctr) / first_half_ctr) * 100
+            frequency_increase = ((second_half_frequency - first_half_frequency) / first_half_frequency) * 100
+            
+            fatigued_ad = {
+                'ad_id': ad_id,
+                'ad_name': ad_name,
+                'days_running': days_running,
+                'ctr_decline': ctr_decline,
+                'frequency_increase': frequency_increase,
+                'first_half_ctr': first_half_ctr,
+                'second_half_ctr': second_half_ctr,
+                'first_half_frequency': first_half_frequency,
+                'second_half_frequency': second_half_frequency,
+                'severity': 'high' if severe[code] else 'medium'
+            }
+            
+            fatigued_ads.append(fatigued_ad)
+            
+            # Add recommendation
+            severity_word = 'severe' if fatigued_ad['severity'] == 'high' else 'moderate'
+            insights['recommendations'].append({
+                'type': 'ad_fatigue',
+                'platform': platform,
+                'ad_id': ad_id,
+                'ad_name': ad_name,
+                'days_running': days_running,
+                'ctr_decline': abs(ctr_decline),
+                'frequency_increase': frequency_increase,
+                'severity': fatigued_ad['severity'],
+                'potential_savings': 0,  # Ad fatigue is about performance improvement, not direct savings
+                'recommendation': f"{severity_word.capitalize()} fatigue detected in ad '{ad_name}' after {days_running} days with CTR declining by {abs(ctr_decline):.1f}% while frequency increased by {frequency_increase:.1f}%. {'Pause and replace with fresh creative.' if fatigued_ad['severity'] == 'high' else 'Consider refreshing creative or adjusting targeting.'}"
+            })
+    
         insights['fatigued_ads'] = fatigued_ads
     
     return insights
 
-def analyze_creative_performance(processed_data, metrics, platform):
+def _first_k_positions(keys, k):
+    """
+    Positions of the k smallest keys in ascending order, earlier positions
+    winning ties (like Series.nsmallest with keep='first').
+    
+    A partition finds the cut-off key in linear time, so only the candidates
+    at or below it are sorted.
+    
+    Args:
+        keys (ndarray): Keys without NaN
+        k (int): Number of positions to return
+        
+    Returns:
+        ndarray: Up to k positions into keys
+    """
+    if len(keys) > k:
+        cutoff = np.partition(keys, k - 1)[k - 1]
+        candidates = np.flatnonzero(keys <= cutoff)
+    else:
+        candidates = np.arange(len(keys))
+    
+    return candidates[np.argsort(keys[candidates], kind='stable')][:k]
+
+def analyze_creative_performance(df, metrics, platform):
     """Analyze creative performance and identify top/bottom performers"""
     insights = {
         'recommendations': []
     }
     
-    # Use the master dataset if available
-    df = processed_data.get('master', processed_data.get('insights', None))
-    if df is None or df.empty:
+    # Without a dataset there is nothing to analyze
+    if df is None:
         return insights
     
+    columns = frozenset(df.columns)
+    
     # Check if we have creative-level data
-    creative_id_field = 'creative_id' if 'creative_id' in df.columns else ('ad_id' if 'ad_id' in df.columns else None)
-    creative_name_field = 'creative_name' if 'creative_name' in df.columns else ('ad_name' if 'ad_name' in df.columns else None)
+    creative_id_field = 'creative_id' if 'creative_id' in columns else ('ad_id' if 'ad_id' in columns else None)
+    creative_name_field = 'creative_name' if 'creative_name' in columns else ('ad_name' if 'ad_name' in columns else None)
     
     if creative_id_field and creative_name_field:
         # Group by creative
-        creative_metrics = df.groupby([creative_id_field, creative_name_field]).agg({
-            'spend': 'sum',
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'purchases': 'sum' if 'purchases' in df.columns else 'count'
-        }).reset_index()
+        creative_metrics = df.groupby([creative_id_field, creative_name_field], observed=True).agg(
+            spend=('spend', 'sum'),
+            impressions=('impressions', 'sum'),
+            clicks=('clicks', 'sum'),
+            purchases=('purchases', 'sum' if 'purchases' in columns else 'count')
+        ).reset_index()
         
-        # Calculate performance metrics
-        creative_metrics['ctr'] = (creative_metrics['clicks'] / creative_metrics['impressions']) * 100
-        creative_metrics['conversion_rate'] = (creative_metrics['purchases'] / creative_metrics['clicks']) * 100
-        creative_metrics['cpa'] = creative_metrics['spend'] / creative_metrics['purchases']
-        
-        # Replace infinities with NaN
-        creative_metrics = creative_metrics.replace([np.inf, -np.inf], np.nan)
+        # Calculate performance metrics (infinite ratios become NaN)
+        creative_metrics['ctr'] = _finite_ratio(creative_metrics['clicks'], creative_metrics['impressions'], 100)
+        creative_metrics['conversion_rate'] = _finite_ratio(creative_metrics['purchases'], creative_metrics['clicks'], 100)
+        creative_metrics['cpa'] = _finite_ratio(creative_metrics['spend'], creative_metrics['purchases'])
         
         # Exclude creatives with insufficient data
         valid_creatives = creative_metrics[
@@ -365,126 +524,164 @@ def analyze_creative_performance(processed_data, metrics, platform):
         
         if not valid_creatives.empty and len(valid_creatives) >= 2:
             # Find top and bottom performers by conversion rate
-            top_creatives = valid_creatives.nlargest(3, 'conversion_rate')
-            bottom_creatives = valid_creatives.nsmallest(3, 'conversion_rate')
+            conversion_rates = valid_creatives['conversion_rate'].to_numpy(dtype=np.float64)
+            top_creatives = valid_creatives.iloc[_first_k_positions(-conversion_rates, 3)]
+            bottom_creatives = valid_creatives.iloc[_first_k_positions(conversion_rates, 3)]
             
             # Store top and bottom performers
             insights['top_creatives'] = top_creatives.to_dict('records')
             insights['bottom_creatives'] = bottom_creatives.to_dict('records')
             
             # Generate recommendations for top performers
-            for _, creative in top_creatives.head(1).iterrows():
+            top_rows = _iter_records(top_creatives.head(1),
+                                     [creative_id_field, creative_name_field, 'conversion_rate', 'ctr'])
+            for creative_id, creative_name, conversion_rate, ctr in top_rows:
                 insights['recommendations'].append({
                     'type': 'top_creative',
                     'platform': platform,
-                    'creative_id': creative[creative_id_field],
-                    'creative_name': creative[creative_name_field],
-                    'conversion_rate': creative['conversion_rate'],
-                    'ctr': creative['ctr'],
+                    'creative_id': creative_id,
+                    'creative_name': creative_name,
+                    'conversion_rate': conversion_rate,
+                    'ctr': ctr,
                     'severity': 'low',  # This is a positive insight
                     'potential_savings': 0,  # This is about improvement, not savings
-                    'recommendation': f"Scale budget for top-performing ad '{creative[creative_name_field]}' with exceptional conversion rate of {creative['conversion_rate']:.2f}% and CTR of {creative['ctr']:.2f}%."
+                    'recommendation': f"Scale budget for top-performing ad '{creative_name}' with exceptional conversion rate of {conversion_rate:.2f}% and CTR of {ctr:.2f}%."
                 })
             
             # Generate recommendations for bottom performers with significant difference
             top_cr = top_creatives['conversion_rate'].iloc[0]
-            for _, creative in bottom_creatives.head(1).iterrows():
-                if creative['conversion_rate'] < top_cr * 0.3:  # Less than 30% of top performer
+            bottom_rows = _iter_records(bottom_creatives.head(1),
+                                        [creative_id_field, creative_name_field, 'conversion_rate', 'ctr', 'spend'])
+            for creative_id, creative_name, conversion_rate, ctr, creative_spend in bottom_rows:
+                if conversion_rate < top_cr * 0.3:  # Less than 30% of top performer
                     insights['recommendations'].append({
                         'type': 'bottom_creative',
                         'platform': platform,
-                        'creative_id': creative[creative_id_field],
-                        'creative_name': creative[creative_name_field],
-                        'conversion_rate': creative['conversion_rate'],
-                        'ctr': creative['ctr'],
+                        'creative_id': creative_id,
+                        'creative_name': creative_name,
+                        'conversion_rate': conversion_rate,
+                        'ctr': ctr,
                         'top_conversion_rate': top_cr,
                         'severity': 'medium',
-                        'potential_savings': creative['spend'] * 0.7,  # Reallocate 70% of spend
-                        'recommendation': f"Consider pausing underperforming ad '{creative[creative_name_field]}' with low conversion rate of {creative['conversion_rate']:.2f}% compared to top performer at {top_cr:.2f}%."
+                        'potential_savings': creative_spend * 0.7,  # Reallocate 70% of spend
+                        'recommendation': f"Consider pausing underperforming ad '{creative_name}' with low conversion rate of {conversion_rate:.2f}% compared to top performer at {top_cr:.2f}%."
                     })
     
     return insights
 
+# Metrics whose trends are analyzed, in output order
+_TREND_METRICS = ('ctr', 'conversion_rate', 'cpa', 'cpc')
+
 def analyze_trends(trends, platform):
     """Analyze metric trends over time"""
-    insights = {
-        'recommendations': []
-    }
-    
-    # Check if we have trend data for key metrics
-    for metric in ['ctr', 'conversion_rate', 'cpa', 'cpc']:
+    # The analysis depends only on each key metric's change and direction, so
+    # repeated audits of the same period share a cached result. Value types are
+    # part of the key because they show up in the output (20 and 20.0 hash alike)
+    trend_key = []
+    for metric in _TREND_METRICS:
         if metric in trends:
             metric_trend = trends[metric]
             percent_change = metric_trend.get('percent_change', 0)
             is_improving = metric_trend.get('is_improving', False)
+            trend_key.append((metric, percent_change, is_improving, type(percent_change), type(is_improving)))
+    
+    # Callers extend and modify the result, so hand out a copy of the cached one
+    cached = _analyze_trends_cached(tuple(trend_key), platform)
+    return {key: [dict(rec) for rec in value] if key == 'recommendations' else dict(value)
+            for key, value in cached.items()}
+
+@functools.lru_cache(maxsize=128)
+def _analyze_trends_cached(trend_key, platform):
+    """
+    Analyze metric trends from their canonical form.
+    
+    Args:
+        trend_key (tuple): (metric, percent_change, is_improving, and the types
+            of both values) for each key metric with trend data
+        platform (str): Platform name
+        
+    Returns:
+        dict: Trend insights and recommendations (shared, not to be modified)
+    """
+    insights = {
+        'recommendations': []
+    }
+    
+    for metric, percent_change, is_improving, _, _ in trend_key:
+        # Generate insights for significant changes (>15%)
+        if abs(percent_change) > 15:
+            # Format the trend direction and recommendation based on the metric
+            if metric in ['ctr', 'conversion_rate']:
+                direction = 'increased' if percent_change > 0 else 'decreased'
+                sentiment = 'positive' if percent_change > 0 else 'negative'
+            else:  # cpa, cpc - lower is better
+                direction = 'decreased' if percent_change < 0 else 'increased'
+                sentiment = 'positive' if percent_change < 0 else 'negative'
             
-            # Generate insights for significant changes (>15%)
-            if abs(percent_change) > 15:
-                # Format the trend direction and recommendation based on the metric
-                if metric in ['ctr', 'conversion_rate']:
-                    direction = 'increased' if percent_change > 0 else 'decreased'
-                    sentiment = 'positive' if percent_change > 0 else 'negative'
-                else:  # cpa, cpc - lower is better
-                    direction = 'decreased' if percent_change < 0 else 'increased'
-                    sentiment = 'positive' if percent_change < 0 else 'negative'
-                
-                # Add to insights
-                insights[f'{metric}_trend'] = {
-                    'percent_change': percent_change,
-                    'direction': direction,
-                    'sentiment': sentiment,
-                    'is_improving': is_improving
-                }
+            # Add to insights
+            insights[f'{metric}_trend'] = {
+                'percent_change': percent_change,
+                'direction': direction,
+                'sentiment': sentiment,
+                'is_improving': is_improving
+            }
+            
+            # Generate recommendation for negative trends only
+            if sentiment == 'negative' and abs(percent_change) > 25:
+                metric_name = metric.upper()
                 
-                # Generate recommendation for negative trends only
-                if sentiment == 'negative' and abs(percent_change) > 25:
-                    metric_name = metric.upper()
-                    
-                    if metric in ['ctr', 'conversion_rate']:
-                        insights['recommendations'].append({
-                            'type': f'{metric}_trend',
-                            'platform': platform,
-                            'percent_change': abs(percent_change),
-                            'severity': 'medium' if abs(percent_change) > 35 else 'low',
-                            'potential_savings': 0,  # Trend insights are about performance, not direct savings
-                            'recommendation': f"{metric_name} has declined by {abs(percent_change):.1f}% over the analysis period. Consider refreshing creatives and reviewing audience targeting."
-                        })
-                    else:  # cpa, cpc
-                        insights['recommendations'].append({
-                            'type': f'{metric}_trend',
-                            'platform': platform,
-                            'percent_change': abs(percent_change),
-                            'severity': 'medium' if abs(percent_change) > 35 else 'low',
-                            'potential_savings': 0,  # Difficult to estimate without more data
-                            'recommendation': f"{metric_name} has increased by {abs(percent_change):.1f}% over the analysis period. Evaluate bidding strategy and audience quality."
-                        })
+                if metric in ['ctr', 'conversion_rate']:
+                    insights['recommendations'].append({
+                        'type': f'{metric}_trend',
+                        'platform': platform,
+                        'percent_change': abs(percent_change),
+                        'severity': 'medium' if abs(percent_change) > 35 else 'low',
+                        'potential_savings': 0,  # Trend insights are about performance, not direct savings
+                        'recommendation': f"{metric_name} has declined by {abs(percent_change):.1f}% over the analysis period. Consider refreshing creatives and reviewing audience targeting."
+                    })
+                else:  # cpa, cpc
+                    insights['recommendations'].append({
+                        'type': f'{metric}_trend',
+                        'platform': platform,
+                        'percent_change': abs(percent_change),
+                        'severity': 'medium' if abs(percent_change) > 35 else 'low',
+                        'potential_savings': 0,  # Difficult to estimate without more data
+                        'recommendation': f"{metric_name} has increased by {abs(percent_change):.1f}% over the analysis period. Evaluate bidding strategy and audience quality."
+                    })
     
     return insights
 
 def estimate_potential_savings(insights):
     """Estimate total potential savings from all insights"""
-    total_savings = 0
-    
-    # Sum up potential savings from all recommendations
-    for rec in insights.get('recommendations', []):
-        total_savings += rec.get('potential_savings', 0)
-    
+    total_savings, _, _ = _summarize_recommendations(insights.get('recommendations', []))
     return total_savings
 
 def estimate_potential_improvement(insights, metrics):
     """Estimate potential performance improvement percentage"""
     # Start with a baseline improvement estimate based on recommendations
-    baseline_improvement = 0
+    _, high_severity_count, medium_severity_count = _summarize_recommendations(insights.get('recommendations', []))
+    return _improvement_estimate(high_severity_count, medium_severity_count)
+
+def _summarize_recommendations(recommendations):
+    """Total potential savings and high/medium severity counts in a single pass"""
+    total_savings = 0
     high_severity_count = 0
     medium_severity_count = 0
     
-    for rec in insights.get('recommendations', []):
+    for rec in recommendations:
+        total_savings += rec.get('potential_savings', 0)
         severity = rec.get('severity', 'low')
         if severity == 'high':
             high_severity_count += 1
         elif severity == 'medium':
             medium_severity_count += 1
     
+    return total_savings, high_severity_count, medium_severity_count
+
+def _improvement_estimate(high_severity_count, medium_severity_count):
+    """Potential improvement percentage from high/medium severity counts"""
+    baseline_improvement = 0
+    
     # More high severity issues = more improvement potential
     if high_severity_count > 0:
         baseline_improvement += high_severity_count * 5  # 5% per high severity issue
@@ -497,6 +694,21 @@ def estimate_potential_improvement(insights, metrics):
     
     return baseline_improvement
 
+# Priority points by recommendation severity (any other severity scores 10)
+_SEVERITY_PRIORITY = {'high': 100, 'medium': 50}
+
+def _type_priority(rec_type):
+    """Priority points for a recommendation type"""
+    # Budget-related recommendations get priority boost
+    if any(budget_term in rec_type for budget_term in ['cpa', 'budget', 'spend', 'cost']):
+        return 20
+    
+    # Creative performance gets secondary priority
+    elif any(creative_term in rec_type for creative_term in ['creative', 'ad_', 'fatigue']):
+        return 10
+    
+    return 0
+
 def prioritize_recommendations(recommendations):
     """
     Prioritize recommendations based on potential impact and severity.
@@ -507,38 +719,31 @@ def prioritize_recommendations(recommendations):
     Returns:
         list: Prioritized list of recommendations
     """
-    # Assign priority scores to each recommendation
-    for rec in recommendations:
-        severity = rec.get('severity', 'low')
-        potential_savings = rec.get('potential_savings', 0)
-        
-        # Base score on severity
-        if severity == 'high':
-            priority_score = 100
-        elif severity == 'medium':
-            priority_score = 50
-        else:
-            priority_score = 10
-        
-        # Adjust score based on potential savings
-        if potential_savings > 0:
-            # More savings = higher priority
-            priority_score += min(potential_savings / 10, 100)  # Cap at 100 additional points
-        
-        # Adjust score based on recommendation type
-        rec_type = rec.get('type', '')
-        
-        # Budget-related recommendations get priority boost
-        if any(budget_term in rec_type for budget_term in ['cpa', 'budget', 'spend', 'cost']):
-            priority_score += 20
-        
-        # Creative performance gets secondary priority
-        elif any(creative_term in rec_type for creative_term in ['creative', 'ad_', 'fatigue']):
-            priority_score += 10
-        
-        rec['priority_score'] = priority_score
-    
-    # Sort by priority score (descending)
-    prioritized = sorted(recommendations, key=lambda x: x.get('priority_score', 0), reverse=True)
+    # Base score on severity
+    base_scores = np.fromiter((_SEVERITY_PRIORITY.get(rec.get('severity', 'low'), 10) for rec in recommendations),
+                              dtype=np.float64, count=len(recommendations))
+    
+    # Adjust score based on potential savings: more savings = higher priority
+    savings = np.fromiter((rec.get('potential_savings', 0) for rec in recommendations),
+                          dtype=np.float64, count=len(recommendations))
+    with np.errstate(invalid='ignore'):
+        has_savings = savings > 0
+        savings_scores = np.where(has_savings, np.minimum(savings / 10, 100), 0.0)  # Cap at 100 additional points
+    
+    # Adjust score based on recommendation type (scored once per distinct type)
+    rec_types = [rec.get('type', '') for rec in recommendations]
+    type_scores = {rec_type: _type_priority(rec_type) for rec_type in set(rec_types)}
+    
+    priority_scores = (base_scores + savings_scores) + np.fromiter(
+        (type_scores[rec_type] for rec_type in rec_types), dtype=np.float64, count=len(recommendations))
+    
+    # Scores are whole numbers unless they include an uncapped share of the savings
+    fractional = has_savings & (savings / 10 <= 100)
+    for rec, priority_score, is_fractional in zip(recommendations, priority_scores.tolist(), fractional.tolist()):
+        rec['priority_score'] = priority_score if is_fractional else int(priority_score)
+    
+    # Sort by priority score (descending, ties keep their order)
+    order = np.argsort(-priority_scores, kind='stable')
+    prioritized = [recommendations[i] for i in order.tolist()]
     
     return prioritized
\ No newline at end of file
@@ -173,8 +173,9 @@ def identify_kpi_trends(processed_data, platform, lookback_days):
     if df.empty or 'date' not in df.columns:
         return trends
     
-    # Ensure date is datetime
-    df['date'] = pd.to_datetime(df['date'])
+    # Ensure date is datetime (master is shared with insights, so only rewrite if needed)
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'])
     
     # Group by date
     daily_metrics = df.groupby('date').agg({
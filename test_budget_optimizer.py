@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from processing.budget_optimizer import BudgetOptimizer
+
+def test_join_on_id_matches_inner_merge():
+    """_join_on_id gives the same frame as an inner pd.merge on the ID column"""
+    entities = pd.DataFrame({
+        'campaign_id': ['c3', 'c1', np.nan, 'c2', 'c1', 'c9', np.nan],
+        'name': ['three', 'one', 'missing', 'two', 'one again', 'no metrics', 'missing again'],
+        'spend': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]  # Clashes with the metric column
+    })
+    metrics = pd.DataFrame({
+        'campaign_id': ['c1', 'c2', 'c3', np.nan],
+        'spend': [10.0, 20.0, 30.0, 40.0],
+        'clicks': [1, 2, 3, 4]
+    })
+
+    joined = BudgetOptimizer()._join_on_id(entities, metrics, 'campaign_id')
+
+    pd.testing.assert_frame_equal(joined, pd.merge(entities, metrics, on='campaign_id'))
+
+def test_join_on_id_without_matches():
+    """Entities without metrics give an empty frame with the merged columns"""
+    entities = pd.DataFrame({'ad_id': ['a1', 'a2'], 'name': ['one', 'two']})
+    metrics = pd.DataFrame({'ad_id': ['a3'], 'clicks': [5]})
+
+    joined = BudgetOptimizer()._join_on_id(entities, metrics, 'ad_id')
+    expected = pd.merge(entities, metrics, on='ad_id')
+
+    assert list(joined.columns) == list(expected.columns)
+    assert joined.empty
+
+def test_score_kernel_matches_numpy(monkeypatch):
+    """The numba scoring kernel gives the same scores as the NumPy fallback"""
+    pytest.importorskip('numba')
+    from processing import budget_optimizer
+
+    rng = np.random.default_rng(0)
+    metrics = ['ctr_index', 'cpm_index', 'cpc_index', 'conversion_rate_index', 'cpa_index']
+    indices = rng.uniform(-20, 300, size=(200, len(metrics)))
+    indices[rng.random(indices.shape) < 0.3] = np.nan
+    indices[:5] = np.nan  # Rows without any usable metric
+    df = pd.DataFrame(indices, columns=metrics)
+
+    optimizer = BudgetOptimizer()
+    compiled = optimizer._calculate_efficiency_score_vec(df)
+    monkeypatch.setattr(budget_optimizer, '_score_kernel', None)
+
+    np.testing.assert_allclose(compiled, optimizer._calculate_efficiency_score_vec(df), rtol=1e-12)
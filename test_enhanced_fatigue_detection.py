@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from processing.enhanced_fatigue_detection import _group_moments, _linregress_moments
+
+def _fit(groups_xy):
+    """Fit every (x, y) group through the moment path, skipping NaN observations"""
+    groups = np.repeat(np.arange(len(groups_xy)), [len(x) for x, _ in groups_xy])
+    x = np.concatenate([np.asarray(x, dtype=np.float64) for x, _ in groups_xy])
+    y = np.concatenate([np.asarray(y, dtype=np.float64) for _, y in groups_xy])
+    use = ~np.isnan(x) & ~np.isnan(y)
+
+    moments = _group_moments(groups, len(groups_xy), x[:, None], y[:, None], use[:, None])
+    return _linregress_moments(*moments[0])
+
+def test_linregress_moments_matches_scipy():
+    """Per-group fits agree with scipy.stats.linregress, including two-point and flat groups"""
+    rng = np.random.default_rng(0)
+    noisy_x = np.arange(14.0)
+    groups_xy = [
+        (noisy_x, 0.3 * noisy_x + rng.normal(size=14)),
+        ([1.0, 2.0], [5.0, 3.0]),                  # Two points
+        ([1.0, 2.0], [4.0, 4.0]),                  # Two points on a flat line
+        ([0.0, 1.0, 2.0, 3.0], [2.0, 2.0, 2.0, 2.0]),  # Flat line
+        ([0.0, 1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0, 5.0]),  # Exact line
+        ([0.0, 1.0, np.nan, 3.0, 4.0, 5.0], [0.5, np.nan, 2.0, 2.5, 1.0, 4.0])  # Missing days
+    ]
+
+    fits = _fit(groups_xy)
+
+    for i, (x, y) in enumerate(groups_xy):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        keep = ~np.isnan(x) & ~np.isnan(y)
+        expected = stats.linregress(x[keep], y[keep])
+
+        np.testing.assert_allclose(fits['slope'][i], expected.slope, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(fits['intercept'][i], expected.intercept, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(fits['r_value'][i], expected.rvalue, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(fits['p_value'][i], expected.pvalue, rtol=1e-7, atol=1e-12)
+
+def test_linregress_moments_identical_x():
+    """All x values identical raises the same ValueError as scipy.stats.linregress"""
+    groups_xy = [([0.0, 1.0, 2.0], [1.0, 2.0, 4.0]), ([3.0, 3.0, 3.0], [1.0, 2.0, 3.0])]
+
+    with pytest.raises(ValueError):
+        stats.linregress(*groups_xy[1])
+    with pytest.raises(ValueError):
+        _fit(groups_xy)
+
+def test_moment_kernel_matches_numpy(monkeypatch):
+    """The numba moments kernel gives the same sums as the NumPy fallback"""
+    pytest.importorskip('numba')
+    from processing import enhanced_fatigue_detection
+
+    rng = np.random.default_rng(0)
+    groups = np.sort(rng.integers(0, 30, size=500))
+    xs = rng.normal(size=(500, 3))
+    ys = rng.normal(size=(500, 3))
+    use = rng.random((500, 3)) < 0.8
+
+    compiled = _group_moments(groups, 32, xs, ys, use)  # Last groups are empty
+    monkeypatch.setattr(enhanced_fatigue_detection, '_moment_kernel', None)
+
+    np.testing.assert_allclose(compiled, _group_moments(groups, 32, xs, ys, use), rtol=1e-9, equal_nan=True)
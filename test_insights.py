@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from processing import insights
+
+def test_half_mean_kernel_matches_numpy(monkeypatch):
+    """The numba half-mean kernel gives the same means as the NumPy fallback"""
+    pytest.importorskip('numba')
+
+    rng = np.random.default_rng(0)
+    codes = np.sort(rng.integers(0, 40, size=600))
+    values = rng.normal(size=(600, 3))
+    values[rng.random(values.shape) < 0.2] = np.nan
+
+    compiled = insights._half_means(codes, 42, values)  # Last groups are empty
+    monkeypatch.setattr(insights, '_half_mean_kernel', None)
+
+    np.testing.assert_allclose(compiled, insights._half_means(codes, 42, values), rtol=1e-12, equal_nan=True)